@@ -1,13 +1,22 @@
+import hashlib
 import json
-import time
-from datetime import datetime
-from typing import List
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional, Tuple
 
 from app.config import Config
 from app.database import db_manager
+from app.encoding import dumps, loads
 from app.logging import get_logger
-from app.models import ConnectionStats, HealthCheck, MessageResponse
-from fastapi import APIRouter, Depends, HTTPException, Request
+from app.message_cache import recent_messages_key
+from app.message_stream import last_hour_counter_keys
+from app.metrics import render as render_metrics
+from app.models import (ConnectionStats, HealthCheck, LoadStatus,
+                        MessageResponse, SearchResponse)
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy import text
 
 logger = get_logger()
 
@@ -42,8 +51,12 @@ async def health_check(request: Request):
         # Check if Discord bot is running by checking if it's in the application state
         if hasattr(request.app.state, 'discord_bot') and request.app.state.discord_bot:
             bot = request.app.state.discord_bot
+            leader_elector = getattr(request.app.state, 'leader_elector', None)
             if bot.is_ready():
                 components["discord"] = "healthy"
+            elif leader_elector is None or not leader_elector.is_leader:
+                # Another worker owns the Discord connection
+                components["discord"] = "standby"
             else:
                 components["discord"] = "connecting"
         else:
@@ -58,9 +71,8 @@ async def health_check(request: Request):
     
     # Check database
     try:
-        db = db_manager.get_session()
-        db.execute("SELECT 1")
-        db.close()
+        async with db_manager.session("health_check") as db:
+            await db.execute(text("SELECT 1"))
         components["database"] = "healthy"
     except Exception as e:
         logger.error("Database health check failed", error=str(e))
@@ -96,28 +108,210 @@ async def health_check(request: Request):
 
 
 @router.get("/stats", response_model=ConnectionStats, dependencies=[Depends(verify_api_key)])
-async def get_stats(request: Request):
-    """Get connection statistics"""
+async def get_stats(request: Request, details: bool = False):
+    """Get connection statistics, with per-connection metrics when details=true"""
     websocket_manager = request.app.state.websocket_manager
     redis_client = request.app.state.redis
 
     connections_by_ip = websocket_manager.get_connection_stats()
     total_connections = websocket_manager.get_total_connections()
-    now = int(time.time())
-    messages_last_hour = await redis_client.zcount("messages_last_hour", now - 3600, now)
+    traffic = websocket_manager.get_traffic_totals()
+    minute_counts = await redis_client.mget(last_hour_counter_keys())
+    messages_last_hour = sum(int(count) for count in minute_counts if count)
     
     return ConnectionStats(
         total_connections=total_connections,
         connections_by_ip=connections_by_ip,
-        messages_sent_last_hour=int(messages_last_hour)
+        messages_sent_last_hour=int(messages_last_hour),
+        bytes_sent=traffic["bytes_sent"],
+        frames_sent=traffic["messages_sent"],
+        database_pool=db_manager.get_pool_stats(),
+        connections=websocket_manager.get_connection_details() if details else None
     )
 
 
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics, combined across workers in multiprocess mode"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/load", response_model=LoadStatus)
+async def get_load(request: Request):
+    """Live admission-control figures for load balancers
+    
+    Responds 503 with a Retry-After header while new WebSocket
+    connections are being refused.
+    """
+    websocket_manager = request.app.state.websocket_manager
+    status = LoadStatus(
+        **websocket_manager.load.snapshot(),
+        connections=websocket_manager.get_total_connections()
+    )
+    if status.accepting:
+        return status
+    return JSONResponse(
+        content=status.model_dump(),
+        status_code=503,
+        headers={"Retry-After": str(websocket_manager.load.retry_after())}
+    )
+
+
+def _parse_cursor(before: str) -> Tuple[datetime, int]:
+    """Parse a before=<created_at>,<id> keyset cursor"""
+    try:
+        timestamp, message_id = before.rsplit(",", 1)
+        created_at = datetime.fromisoformat(timestamp)
+        message_id = int(message_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return _to_naive_utc(created_at), message_id
+
+
+def _to_naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Convert a timestamp to the naive UTC form stored in the database"""
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _cursor_for(payload: str) -> str:
+    """Build the cursor pointing just past a serialized message"""
+    message = loads(payload)
+    return f"{message['timestamp']},{message['id']}"
+
+
 @router.get("/messages", response_model=List[MessageResponse])
-async def get_recent_messages(limit: int = 50):
-    """Get recent messages"""
-    limit = min(limit, Config.MESSAGE_HISTORY_LIMIT)
+async def get_recent_messages(request: Request, limit: int = 50, before: Optional[str] = None,
+                              channel_id: Optional[int] = None):
+    """Get messages newest first, from every channel or just channel_id
+    
+    The hot window is served from the in-process buffer, then the Redis
+    history list; Postgres is only read for older pages. Pass the
+    X-Next-Cursor response header back as before= to page further.
+    """
+    limit = max(1, min(limit, Config.MESSAGE_HISTORY_LIMIT))
+    payloads: List[str] = []
+    cursor = None
+    
+    if before is None:
+        websocket_manager = request.app.state.websocket_manager
+        if channel_id is None:
+            message_buffer = websocket_manager.message_buffer
+        else:
+            message_buffer = websocket_manager.channel_buffers.get(str(channel_id))
+        if message_buffer is not None and len(message_buffer) >= limit:
+            payloads = [frame.json for frame in message_buffer.latest(limit)]
+        else:
+            try:
+                payloads = await request.app.state.redis.lrange(recent_messages_key(channel_id), 0, limit - 1)
+            except Exception as e:
+                logger.error("Failed to read recent messages from Redis", error=str(e))
+        if payloads and len(payloads) < limit:
+            cursor = _parse_cursor(_cursor_for(payloads[-1]))
+    else:
+        cursor = _parse_cursor(before)
+    
+    if len(payloads) < limit:
+        rows = await db_manager.get_messages(limit - len(payloads), cursor, channel_id=channel_id)
+        payloads.extend(dumps(row) for row in rows)
+    
+    body = "[" + ",".join(payloads) + "]"
+    etag = f'W/"{hashlib.blake2b(body.encode(), digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag}
+    if len(payloads) == limit:
+        headers["X-Next-Cursor"] = _cursor_for(payloads[-1])
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers) 
+
+
+@router.get("/messages/search", response_model=SearchResponse)
+async def search_messages(q: str,
+                          channel_id: Optional[int] = None,
+                          author_id: Optional[int] = None,
+                          after: Optional[datetime] = None,
+                          before: Optional[datetime] = None,
+                          limit: int = 20,
+                          cursor: Optional[str] = None):
+    """Full-text search over stored messages, best match first
+    
+    Pass next_cursor back as cursor= for the next page.
+    """
+    limit = max(1, min(limit, Config.SEARCH_MAX_RESULTS))
+    
+    keyset = None
+    if cursor is not None:
+        try:
+            rank, message_id = cursor.split(",", 1)
+            keyset = (float(rank), int(message_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    results = await db_manager.search_messages(
+        q,
+        limit,
+        channel_id=channel_id,
+        author_id=author_id,
+        after=_to_naive_utc(after),
+        before=_to_naive_utc(before),
+        cursor=keyset
+    )
+    
+    next_cursor = None
+    if len(results) == limit:
+        last = results[-1]
+        next_cursor = f"{last['rank']!r},{last['id']}"
+    
+    return SearchResponse(results=results, next_cursor=next_cursor)
+
+
+async def _ndjson_chunks(rows: AsyncIterator[dict], compress: bool) -> AsyncIterator[bytes]:
+    """Encode rows as NDJSON in EXPORT_CHUNK_SIZE chunks, optionally gzipped"""
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+    buffer = []
+    buffered = 0
+    async for row in rows:
+        line = (dumps(row) + "\n").encode()
+        buffer.append(line)
+        buffered += len(line)
+        if buffered >= Config.EXPORT_CHUNK_SIZE:
+            chunk = b"".join(buffer)
+            buffer, buffered = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    
+    chunk = b"".join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+@router.get("/messages/export", dependencies=[Depends(verify_api_key)])
+async def export_messages(request: Request,
+                          channel_id: Optional[int] = None,
+                          after: Optional[datetime] = None,
+                          before: Optional[datetime] = None):
+    """Stream stored messages as NDJSON, oldest first
+    
+    Rows come from a server-side cursor and are written out as the client
+    reads them, so memory stays flat regardless of the export size. The
+    body is gzip-encoded when the client accepts it.
+    """
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    rows = db_manager.stream_messages(
+        channel_id=channel_id,
+        after=_to_naive_utc(after),
+        before=_to_naive_utc(before)
+    )
     
-    # This would need Redis access
-    # For now, return empty list
-    return [] 
\ No newline at end of file
+    headers = {"Content-Disposition": 'attachment; filename="messages.ndjson"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_ndjson_chunks(rows, compress), media_type="application/x-ndjson", headers=headers)
\ No newline at end of file
@@ -10,7 +10,12 @@ from app.api.routes import router
 from app.config import Config, print_config
 from app.database import db_manager
 from app.discord_bot import DiscordBot
+from app.ingest import MessageWriter
+from app.leader_election import LeaderElector
 from app.logging import get_logger, setup_logging
+from app.message_stream import MessageStream
+from app.metrics import mark_process_dead
+from app.partitions import PartitionMaintainer
 from app.websocket_manager import WebSocketManager
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
@@ -25,6 +30,11 @@ class Application:
         self.redis_client: Optional[redis.Redis] = None
         self.discord_bot: Optional[DiscordBot] = None
         self.websocket_manager: Optional[WebSocketManager] = None
+        self.message_stream: Optional[MessageStream] = None
+        self.message_writer: Optional[MessageWriter] = None
+        self.partition_maintainer: Optional[PartitionMaintainer] = None
+        self.leader_elector: Optional[LeaderElector] = None
+        self.bot_task: Optional[asyncio.Task] = None
         self.fastapi_app: Optional[FastAPI] = None
         self.is_shutting_down = False
         
@@ -43,14 +53,28 @@ class Application:
             logger.info("Redis connection established")
             
             # Initialize database
-            db_manager.initialize()
+            await db_manager.initialize()
             logger.info("Database connection established")
+            
+            # Make sure current and upcoming partitions exist before ingesting
+            self.partition_maintainer = PartitionMaintainer()
+            await self.partition_maintainer.run_once()
+            self.partition_maintainer.start()
+            
+            # Start the batched database writer
+            self.message_writer = MessageWriter()
+            self.message_writer.start()
 
             # Initialize WebSocket manager
             self.websocket_manager = WebSocketManager(self.redis_client)
+            await self.websocket_manager.start()
+            
+            # Feed the local WebSocket manager from the shared message stream
+            self.message_stream = MessageStream(self.redis_client, self.websocket_manager)
+            self.message_stream.start()
             
             # Initialize Discord bot
-            self.discord_bot = DiscordBot(self.redis_client, self.websocket_manager)
+            self.discord_bot = DiscordBot(self.redis_client, self.message_stream, self.message_writer)
             
             
             
@@ -76,6 +100,7 @@ class Application:
             allow_credentials=True,
             allow_methods=["*"],
             allow_headers=["*"],
+            expose_headers=["ETag", "X-Next-Cursor"],
         )
         
         # Add routes
@@ -97,13 +122,45 @@ class Application:
         app.state.redis = self.redis_client
         app.state.discord_bot = self.discord_bot
 
-        # Start Discord bot
-        bot_task = asyncio.create_task(self.discord_bot.start())
+        # Start Discord ingest on the elected leader only
+        if Config.INGEST_MODE == "gateway":
+            logger.info("Running in gateway-only mode; Discord ingest disabled")
+        else:
+            self.leader_elector = LeaderElector(self.redis_client, self._start_ingest, self._stop_ingest)
+            self.leader_elector.start()
+        app.state.leader_elector = self.leader_elector
         yield
         
         # Shutdown
         await self.cleanup()
-        bot_task.cancel()
+    
+    async def _start_ingest(self):
+        """Connect to Discord after winning the leader election"""
+        logger.info("Starting Discord ingest")
+        self.bot_task = asyncio.create_task(self.discord_bot.start())
+        self.bot_task.add_done_callback(self._on_bot_exit)
+    
+    def _on_bot_exit(self, task: asyncio.Task):
+        """Hand ingest to a standby when the Discord client stops on its own"""
+        # Stopped by _stop_ingest or shutdown
+        if task is not self.bot_task or self.is_shutting_down:
+            return
+        self.bot_task = None
+        error = None if task.cancelled() else task.exception()
+        print(f"💥 Discord bot stopped: {error or 'client exited'}")
+        logger.error("Discord bot stopped unexpectedly, resigning ingest leadership",
+                    error=str(error) if error else "client exited")
+        if self.leader_elector:
+            asyncio.create_task(self.leader_elector.resign())
+    
+    async def _stop_ingest(self):
+        """Disconnect from Discord after losing leadership"""
+        logger.info("Stopping Discord ingest")
+        # Detach first so the exit callback knows the stop was requested
+        bot_task, self.bot_task = self.bot_task, None
+        await self.discord_bot.close()
+        if bot_task:
+            bot_task.cancel()
     
     async def cleanup(self):
         """Cleanup all application resources"""
@@ -111,16 +168,38 @@ class Application:
         
         logger.info("Starting application cleanup...")
         
+        # Give up ingest leadership so a standby takes over immediately
+        if self.leader_elector:
+            await self.leader_elector.stop()
+        
         # Close Discord bot
         if self.discord_bot:
             await self.discord_bot.close()
         
+        # Flush pending database writes
+        if self.message_writer:
+            await self.message_writer.stop()
+        
+        # Stop consuming the message stream
+        if self.message_stream:
+            await self.message_stream.stop()
+        
+        # Stop WebSocket manager background tasks
+        if self.websocket_manager:
+            await self.websocket_manager.close()
+        
         # Close Redis
         if self.redis_client:
             await self.redis_client.close()
         
+        # Stop partition maintenance
+        if self.partition_maintainer:
+            await self.partition_maintainer.stop()
+        
         # Close database
-        db_manager.close()
+        await db_manager.close()
+        
+        mark_process_dead()
         
         logger.info("Application cleanup completed")
     
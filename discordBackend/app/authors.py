@@ -0,0 +1,71 @@
+from typing import Dict, Iterable, List, Optional
+
+from app.encoding import Frame, batch_frame
+
+# Profile fields a message frame carries inline, replaced by author_id for
+# clients that intern authors
+PROFILE_FIELDS = ("author", "avatar")
+
+
+def _strip_profile(frame: Frame) -> Frame:
+    return Frame.from_data({key: value for key, value in frame.data.items() if key not in PROFILE_FIELDS})
+
+
+def compact_frame(frame: Frame) -> Frame:
+    """The message without its inline author profile, built once per frame"""
+    return frame.variant("compact", _strip_profile)
+
+
+def author_data(message_data: dict) -> dict:
+    """The author profile a message frame carries"""
+    return {"name": message_data.get("author", ""), "avatar": message_data.get("avatar", "")}
+
+
+class AuthorTable:
+    """Current author profiles, each pre-encoded as an {"op": "author"} frame
+    
+    A profile frame is replaced only when the author's name or avatar
+    changes, so connections can tell whether the profile they were last
+    sent is still current with an identity check.
+    """
+    
+    def __init__(self):
+        self.frames: Dict[str, Frame] = {}
+    
+    def __len__(self) -> int:
+        return len(self.frames)
+    
+    def frame_for(self, message_data: dict) -> Frame:
+        """Get the profile frame for a message's author, refreshing it if changed"""
+        author_id = message_data["author_id"]
+        profile = author_data(message_data)
+        frame = self.frames.get(author_id)
+        if frame is None or frame.data["name"] != profile["name"] or frame.data["avatar"] != profile["avatar"]:
+            frame = self.frames[author_id] = Frame.from_data({"op": "author", "id": author_id, **profile})
+        return frame
+    
+    def history_batch(self, frames: Iterable[Frame],
+                      known_authors: Dict[str, Frame]) -> Optional[Frame]:
+        """Build one batch frame of compact messages plus a single author dictionary
+        
+        Records the authors whose current profile the batch delivers in
+        known_authors, so live messages from them go out without a profile.
+        """
+        authors: Dict[str, dict] = {}
+        payloads: List[str] = []
+        for frame in frames:
+            data = frame.data
+            author_id = data.get("author_id")
+            if author_id is None:
+                payloads.append(frame.json)
+                continue
+            authors[author_id] = author_data(data)
+            payloads.append(compact_frame(frame).json)
+        
+        if not payloads:
+            return None
+        for author_id, profile in authors.items():
+            current = self.frames.get(author_id)
+            if current is not None and (current.data["name"], current.data["avatar"]) == (profile["name"], profile["avatar"]):
+                known_authors[author_id] = current
+        return batch_frame(payloads, authors)
@@ -1,33 +1,232 @@
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
 from app.config import Config
-from app.models import Base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from app.metrics import DB_LATENCY, DB_POOL_WAIT
+from app.models import Base, Message
+from sqlalchemy import and_, delete, func, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncEngine, AsyncSession,
+                                    async_sessionmaker, create_async_engine)
+
+
+def get_async_database_url(url: str) -> str:
+    """Point a PostgreSQL URL at the asyncpg driver with statement caching"""
+    database_url = make_url(url)
+    if database_url.drivername in ("postgres", "postgresql", "postgresql+psycopg2"):
+        database_url = database_url.set(drivername="postgresql+asyncpg")
+    if database_url.drivername == "postgresql+asyncpg":
+        database_url = database_url.update_query_dict({
+            "prepared_statement_cache_size": str(Config.DB_STATEMENT_CACHE_SIZE)
+        })
+    return database_url.render_as_string(hide_password=False)
+
+
+class PoolMetrics:
+    """Counts pool checkouts and how long callers waited for a connection"""
+    
+    __slots__ = ("checkouts", "total_wait", "max_wait")
+    
+    def __init__(self):
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+    
+    def record_checkout(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
 
 
 class DatabaseManager:
     """Manages database connections and operations"""
     
     def __init__(self):
-        self.engine = None
-        self.SessionLocal = None
-    
-    def initialize(self):
-        """Initialize database connection and create tables"""
-        self.engine = create_engine(Config.DATABASE_URL)
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
-    
-    def get_session(self) -> Session:
-        """Get a new database session"""
-        if not self.SessionLocal:
+        self.engine: Optional[AsyncEngine] = None
+        self.SessionLocal: Optional[async_sessionmaker] = None
+        self.pool_metrics = PoolMetrics()
+    
+    async def initialize(self):
+        """Initialize the async engine and create tables"""
+        self.engine = create_async_engine(
+            get_async_database_url(Config.DATABASE_URL),
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=Config.DB_POOL_PRE_PING
+        )
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        self.SessionLocal = async_sessionmaker(expire_on_commit=False)
+    
+    @asynccontextmanager
+    async def connection(self, operation: str = "query") -> AsyncIterator[AsyncConnection]:
+        """Check out a pooled connection, recording the checkout wait and how long it was held"""
+        if not self.engine:
             raise RuntimeError("Database not initialized. Call initialize() first.")
-        return self.SessionLocal()
+        started = time.perf_counter()
+        async with self.engine.connect() as connection:
+            wait = time.perf_counter() - started
+            self.pool_metrics.record_checkout(wait)
+            DB_POOL_WAIT.observe(wait)
+            try:
+                yield connection
+            finally:
+                DB_LATENCY.labels(operation).observe(time.perf_counter() - started)
+    
+    @asynccontextmanager
+    async def session(self, operation: str = "query") -> AsyncIterator[AsyncSession]:
+        """Get a new database session bound to a measured pool checkout"""
+        async with self.connection(operation) as connection:
+            async with self.SessionLocal(bind=connection) as session:
+                yield session
+    
+    async def insert_messages(self, rows: List[dict]) -> int:
+        """Insert message rows in one statement, skipping already stored messages"""
+        rows = [
+            {**row, "content_tsv": func.to_tsvector(Config.SEARCH_LANGUAGE, row["content"])}
+            for row in rows
+        ]
+        statement = insert(Message).values(rows).on_conflict_do_nothing(
+            index_elements=[Message.id, Message.created_at]
+        )
+        async with self.connection("insert_messages") as connection:
+            result = await connection.execute(statement)
+            await connection.commit()
+        return result.rowcount
+    
+    async def update_message_content(self, message_id: int, created_at: datetime, content: str) -> int:
+        """Replace the content of a stored message after an edit"""
+        # created_at is part of the key and lets Postgres prune to one partition
+        statement = (
+            update(Message)
+            .where(Message.id == message_id, Message.created_at == created_at)
+            .values(content=content, content_tsv=func.to_tsvector(Config.SEARCH_LANGUAGE, content))
+        )
+        async with self.connection("update_message_content") as connection:
+            result = await connection.execute(statement)
+            await connection.commit()
+        return result.rowcount
+    
+    async def delete_messages(self, keys: List[Tuple[int, datetime]]) -> int:
+        """Delete stored messages by (id, created_at)"""
+        statement = delete(Message).where(tuple_(Message.id, Message.created_at).in_(keys))
+        async with self.connection("delete_messages") as connection:
+            result = await connection.execute(statement)
+            await connection.commit()
+        return result.rowcount
+    
+    async def get_latest_message_id(self, channel_id: int) -> Optional[int]:
+        """Get the ID of the newest stored message in a channel"""
+        query = (
+            select(Message.id)
+            .where(Message.channel_id == channel_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(1)
+        )
+        async with self.session("get_latest_message_id") as db:
+            return await db.scalar(query)
+    
+    async def get_messages(self, limit: int, before: Optional[Tuple[datetime, int]] = None,
+                           channel_id: Optional[int] = None) -> List[dict]:
+        """Get messages newest first, older than the (created_at, id) keyset cursor"""
+        # Snowflake IDs sort exactly like created_at, so the primary key
+        # serves the keyset scan; the timestamp bound narrows the range
+        query = select(Message).order_by(Message.id.desc()).limit(limit)
+        if before is not None:
+            created_at, message_id = before
+            query = query.where(Message.id < message_id, Message.created_at <= created_at)
+        if channel_id is not None:
+            query = query.where(Message.channel_id == channel_id)
+        
+        async with self.session("get_messages") as db:
+            return [message.to_message_data() for message in await db.scalars(query)]
+    
+    async def search_messages(self, query: str, limit: int,
+                              channel_id: Optional[int] = None,
+                              author_id: Optional[int] = None,
+                              after: Optional[datetime] = None,
+                              before: Optional[datetime] = None,
+                              cursor: Optional[Tuple[float, int]] = None) -> List[dict]:
+        """Full-text search, best match first, paged by a (rank, id) keyset cursor"""
+        ts_query = func.websearch_to_tsquery(Config.SEARCH_LANGUAGE, query)
+        rank = func.ts_rank(Message.content_tsv, ts_query).label("rank")
+        
+        statement = (
+            select(Message, rank)
+            .where(Message.content_tsv.op("@@")(ts_query))
+            .order_by(rank.desc(), Message.id.desc())
+            .limit(limit)
+        )
+        if channel_id is not None:
+            statement = statement.where(Message.channel_id == channel_id)
+        if author_id is not None:
+            statement = statement.where(Message.author_id == author_id)
+        if after is not None:
+            statement = statement.where(Message.created_at >= after)
+        if before is not None:
+            statement = statement.where(Message.created_at < before)
+        if cursor is not None:
+            cursor_rank, cursor_id = cursor
+            statement = statement.where(or_(
+                rank < cursor_rank,
+                and_(rank == cursor_rank, Message.id < cursor_id)
+            ))
+        
+        async with self.session("search_messages") as db:
+            result = await db.execute(statement)
+            return [
+                {**message.to_message_data(), "rank": message_rank}
+                for message, message_rank in result
+            ]
+    
+    async def stream_messages(self,
+                              channel_id: Optional[int] = None,
+                              after: Optional[datetime] = None,
+                              before: Optional[datetime] = None) -> AsyncIterator[dict]:
+        """Yield messages oldest first from a server-side cursor"""
+        statement = (
+            select(Message)
+            .order_by(Message.id)
+            .execution_options(yield_per=Config.EXPORT_BATCH_SIZE)
+        )
+        if channel_id is not None:
+            statement = statement.where(Message.channel_id == channel_id)
+        if after is not None:
+            statement = statement.where(Message.created_at >= after)
+        if before is not None:
+            statement = statement.where(Message.created_at < before)
+        
+        async with self.session("stream_messages") as db:
+            result = await db.stream_scalars(statement)
+            async for message in result:
+                yield message.to_message_data()
+    
+    def get_pool_stats(self) -> Dict[str, float]:
+        """Get pool occupancy and checkout wait statistics"""
+        if not self.engine:
+            return {}
+        pool = self.engine.pool
+        metrics = self.pool_metrics
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checkouts": metrics.checkouts,
+            "avg_wait_ms": round(metrics.total_wait / metrics.checkouts * 1000, 3) if metrics.checkouts else 0.0,
+            "max_wait_ms": round(metrics.max_wait * 1000, 3),
+        }
     
-    def close(self):
+    async def close(self):
         """Close database connections"""
         if self.engine:
-            self.engine.dispose()
+            await self.engine.dispose()
 
 
 # Global database manager instance
-db_manager = DatabaseManager() 
\ No newline at end of file
+db_manager = DatabaseManager()
\ No newline at end of file
@@ -1,14 +1,15 @@
-import json
-import time
-from typing import Optional
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
 import discord
 import redis.asyncio as redis
 from app.config import Config
 from app.database import db_manager
+from app.ingest import MessageWriter
 from app.logging import get_logger
-from app.models import Message
-from app.websocket_manager import WebSocketManager
+from app.message_stream import MessageStream
+from app.metrics import RECEIVE_LATENCY, snowflake_age
 
 logger = get_logger()
 
@@ -16,10 +17,13 @@ logger = get_logger()
 class DiscordBot:
     """Manages Discord bot functionality"""
     
-    def __init__(self, redis_client: redis.Redis, websocket_manager: WebSocketManager):
+    def __init__(self, redis_client: redis.Redis, message_stream: MessageStream,
+                 message_writer: MessageWriter):
         self.redis = redis_client
         self.client: Optional[discord.Client] = None
-        self.websocket_manager = websocket_manager
+        self.message_stream = message_stream
+        self.message_writer = message_writer
+        self._backfill_task: Optional[asyncio.Task] = None
         self._setup_bot()
     
     def _setup_bot(self):
@@ -38,18 +42,22 @@ class DiscordBot:
             print(f"📋 Connected to {len(self.client.guilds)} guild(s):")
             for guild in self.client.guilds:
                 print(f"   - {guild.name} (ID: {guild.id})")
-                if guild.id == Config.DISCORD_GUILD_ID:
+                if guild.id in Config.DISCORD_GUILD_IDS:
                     print(f"   ✅ Target guild found: {guild.name}")
                     # List channels in target guild
                     for channel in guild.channels:
                         if hasattr(channel, 'id'):
                             print(f"      📺 Channel: {channel.name} (ID: {channel.id})")
-                            if channel.id == Config.DISCORD_CHANNEL_ID:
+                            if channel.id in Config.DISCORD_CHANNEL_IDS:
                                 print(f"      ✅ Target channel found: {channel.name}")
             
             logger.info("Discord bot ready", 
                        bot_user=str(self.client.user),
                        guilds=[guild.name for guild in self.client.guilds])
+            
+            # on_ready fires again after a reconnect, which can leave a gap too
+            if Config.BACKFILL_ENABLED and not (self._backfill_task and not self._backfill_task.done()):
+                self._backfill_task = asyncio.create_task(self._backfill())
         
         @self.client.event
         async def on_message(message: discord.Message):
@@ -61,6 +69,85 @@ class DiscordBot:
             print(f"   Is bot: {message.author.bot}")
             
             await self._handle_message(message)
+        
+        # Raw events fire whether or not the message is in discord.py's cache
+        @self.client.event
+        async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+            await self._handle_edit(payload)
+        
+        @self.client.event
+        async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+            await self._handle_delete(payload.guild_id, payload.channel_id, [payload.message_id])
+        
+        @self.client.event
+        async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+            await self._handle_delete(payload.guild_id, payload.channel_id, sorted(payload.message_ids))
+    
+    @staticmethod
+    def _is_tracked(guild_id: Optional[int], channel_id: int) -> bool:
+        """Check whether a guild and channel pass the ingest filters"""
+        return guild_id in Config.DISCORD_GUILD_IDS and channel_id in Config.DISCORD_CHANNEL_IDS
+    
+    async def _handle_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Store an edited message and broadcast the new content as a delta"""
+        try:
+            if not self._is_tracked(payload.guild_id, payload.channel_id):
+                return
+            
+            # Embed unfurls and pins also arrive as updates; only content changes matter
+            content = payload.data.get("content")
+            if content is None or (payload.data.get("author") or {}).get("bot"):
+                return
+            if payload.cached_message and payload.cached_message.content == content:
+                return
+            
+            # The snowflake encodes created_at, which locates the row's partition
+            created_at = discord.utils.snowflake_time(payload.message_id).replace(tzinfo=None)
+            updated = await db_manager.update_message_content(payload.message_id, created_at, content)
+            frame = await self.message_stream.publish_delta({
+                "op": "edit",
+                "id": str(payload.message_id),
+                "channel_id": str(payload.channel_id),
+                "content": content
+            })
+            
+            print(f"✏️ Message {payload.message_id} edited (seq {frame.data['seq']})")
+            logger.info("Message edited",
+                       message_id=str(payload.message_id),
+                       rows_updated=updated)
+        
+        except Exception as e:
+            logger.error("Error handling Discord message edit",
+                        message_id=str(payload.message_id),
+                        error=str(e))
+    
+    async def _handle_delete(self, guild_id: Optional[int], channel_id: int, message_ids: List[int]):
+        """Remove deleted messages and broadcast a delta for each"""
+        try:
+            if not self._is_tracked(guild_id, channel_id):
+                return
+            
+            keys = [
+                (message_id, discord.utils.snowflake_time(message_id).replace(tzinfo=None))
+                for message_id in message_ids
+            ]
+            deleted = await db_manager.delete_messages(keys)
+            for message_id in message_ids:
+                await self.message_stream.publish_delta({
+                    "op": "delete",
+                    "id": str(message_id),
+                    "channel_id": str(channel_id)
+                })
+            
+            print(f"🗑️ {len(message_ids)} message(s) deleted")
+            logger.info("Messages deleted",
+                       message_ids=[str(message_id) for message_id in message_ids],
+                       rows_deleted=deleted)
+        
+        except Exception as e:
+            logger.error("Error handling Discord message delete",
+                        message_ids=[str(message_id) for message_id in message_ids],
+                        error=str(e))
     
     async def _handle_message(self, message: discord.Message):
         """Handle incoming Discord messages"""
@@ -72,12 +159,12 @@ class DiscordBot:
                 print("   ❌ Skipping: Message is not from a guild (DM)")
                 return
                 
-            if message.guild.id != Config.DISCORD_GUILD_ID:
-                print(f"   ❌ Skipping: Wrong guild (got {message.guild.id}, expected {Config.DISCORD_GUILD_ID})")
+            if message.guild.id not in Config.DISCORD_GUILD_IDS:
+                print(f"   ❌ Skipping: Guild {message.guild.id} is not configured")
                 return
                 
-            if message.channel.id != Config.DISCORD_CHANNEL_ID:
-                print(f"   ❌ Skipping: Wrong channel (got {message.channel.id}, expected {Config.DISCORD_CHANNEL_ID})")
+            if message.channel.id not in Config.DISCORD_CHANNEL_IDS:
+                print(f"   ❌ Skipping: Channel {message.channel.id} is not configured")
                 return
                 
             if message.author.bot:
@@ -85,50 +172,26 @@ class DiscordBot:
                 return
             
             print(f"   ✅ Message passed all filters - processing...")
+            RECEIVE_LATENCY.observe(snowflake_age(message.id))
             
-            # Store message in database
-            db = db_manager.get_session()
+            # Cache in Redis and fan out to every gateway in one round trip
             try:
-                db_message = Message(
-                    discord_message_id=str(message.id),
-                    author_name=message.author.display_name,
-                    author_id=str(message.author.id),
-                    avatar_url=message.author.avatar.url if message.author.avatar else "",
-                    content=message.content,
-                    channel_id=str(message.channel.id),
-                    guild_id=str(message.guild.id),
-                    created_at=message.created_at
-                )
-                db.add(db_message)
-                db.commit()
-                print(f"   💾 Message saved to database with ID: {db_message.id}")
-                
-                # Cache in Redis
-                message_data = {
-                    "id": str(db_message.id),
-                    "author": message.author.display_name,
-                    "author_id": str(message.author.id),
-                    "avatar": db_message.avatar_url,
-                    "content": message.content,
-                    "timestamp": message.created_at.isoformat()
-                }
-                
-                await self.redis.lpush("recent_messages", json.dumps(message_data))
-                await self.redis.ltrim("recent_messages", 0, Config.MESSAGE_HISTORY_LIMIT - 1)
-                print(f"   📦 Message cached in Redis")
-
-                now = int(time.time())
-                await self.redis.zadd("messages_last_hour", {str(now): now})
-                await self.redis.zremrangebyscore("messages_last_hour", 0, now - 3600)
-
-                await self.websocket_manager.broadcast_message(message_data)
-                
-                logger.info("Message processed", 
-                           message_id=str(message.id),
-                           author=message.author.display_name)
-                
-            finally:
-                db.close()
+                frame = await self.message_stream.publish(self._message_data(message))
+                print(f"   📦 Message cached in Redis (seq {frame.data['seq']})")
+            except Exception as e:
+                # A Redis outage must not cost the database its copy
+                print(f"   💥 Error publishing message: {str(e)}")
+                logger.error("Error publishing Discord message",
+                            message_id=str(message.id),
+                            error=str(e))
+            
+            # Persist in the background; the writer batches inserts off the event loop
+            await self.message_writer.submit(self._message_row(message))
+            print(f"   💾 Message queued for database write")
+            
+            logger.info("Message processed", 
+                       message_id=str(message.id),
+                       author=message.author.display_name)
                 
         except Exception as e:
             print(f"   💥 Error processing message: {str(e)}")
@@ -136,14 +199,110 @@ class DiscordBot:
                         message_id=str(message.id) if message else "unknown",
                         error=str(e))
     
+    @staticmethod
+    def _message_row(message: discord.Message) -> dict:
+        """Build the database row for a message"""
+        return {
+            "id": message.id,
+            "channel_id": message.channel.id,
+            "guild_id": message.guild.id,
+            "author_id": message.author.id,
+            # Stored as naive UTC
+            "created_at": message.created_at.replace(tzinfo=None),
+            "author_name": message.author.display_name,
+            "avatar_url": message.author.avatar.url if message.author.avatar else "",
+            "content": message.content
+        }
+    
+    @staticmethod
+    def _message_data(message: discord.Message) -> dict:
+        """Build the payload cached in Redis and sent to clients"""
+        return {
+            "id": str(message.id),
+            "channel_id": str(message.channel.id),
+            "author": message.author.display_name,
+            "author_id": str(message.author.id),
+            "avatar": message.author.avatar.url if message.author.avatar else "",
+            "content": message.content,
+            "timestamp": message.created_at.isoformat()
+        }
+    
+    async def _backfill(self):
+        """Store and cache messages posted while the bot was offline
+        
+        Reads each channel's history between the newest stored message and
+        the moment the bot became ready; anything later arrives through
+        on_message. Rows are bulk-inserted directly rather than through the
+        message writer, so a large gap cannot back up live ingest.
+        """
+        cutoff = discord.Object(id=discord.utils.time_snowflake(datetime.now(timezone.utc)))
+        for channel_id in sorted(Config.DISCORD_CHANNEL_IDS):
+            channel = self.client.get_channel(channel_id)
+            if channel is None:
+                logger.warning("Backfill skipped, target channel not found", channel_id=channel_id)
+                continue
+            await self._backfill_channel(channel, cutoff)
+    
+    async def _backfill_channel(self, channel: discord.TextChannel, cutoff: discord.Object):
+        """Backfill one channel up to cutoff"""
+        try:
+            latest_id = await db_manager.get_latest_message_id(channel.id)
+            # Nothing older than the retention window has a partition to land in
+            retention_start = discord.utils.time_snowflake(
+                datetime.now(timezone.utc) - timedelta(seconds=Config.MESSAGE_TTL))
+            after = discord.Object(id=max(latest_id or 0, retention_start))
+            
+            # Newest first, so a gap larger than BACKFILL_LIMIT still leaves the latest messages stored
+            missed: List[discord.Message] = []
+            async for message in channel.history(limit=Config.BACKFILL_LIMIT, after=after,
+                                                 before=cutoff, oldest_first=False):
+                if not message.author.bot:
+                    missed.append(message)
+            missed.reverse()
+            
+            if not missed:
+                logger.info("Backfill found no missed messages", channel_id=channel.id)
+                return
+            
+            inserted = 0
+            for start in range(0, len(missed), Config.INGEST_BATCH_SIZE):
+                batch = missed[start:start + Config.INGEST_BATCH_SIZE]
+                inserted += await db_manager.insert_messages([self._message_row(message) for message in batch])
+            
+            # Missed messages are history, not news: merge the tail into the
+            # cached lists in order instead of broadcasting it to clients
+            cached = await self.message_stream.rehydrate(
+                channel.id, [self._message_data(message) for message in missed[-Config.MESSAGE_HISTORY_LIMIT:]])
+            
+            print(f"🔁 Backfilled {inserted} missed message(s) from #{channel.name}")
+            logger.info("Backfill completed",
+                       channel_id=channel.id,
+                       fetched=len(missed),
+                       inserted=inserted,
+                       cached=cached)
+        
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Backfill failed", channel_id=channel.id, error=str(e))
+    
     async def start(self):
         """Start the Discord bot"""
         if not self.client:
             raise RuntimeError("Discord client not initialized")
+        if self.client.is_closed():
+            # A closed client cannot reconnect; build a fresh one after a leadership handover
+            self._setup_bot()
         await self.client.start(Config.DISCORD_TOKEN)
     
     async def close(self):
         """Close the Discord bot"""
+        if self._backfill_task and not self._backfill_task.done():
+            self._backfill_task.cancel()
+            try:
+                await self._backfill_task
+            except asyncio.CancelledError:
+                pass
         if self.client:
             await self.client.close()
     
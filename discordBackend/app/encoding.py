@@ -0,0 +1,140 @@
+import json
+import zlib
+from typing import Any, Callable, Dict, Optional, Sequence, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional encoding
+    msgpack = None
+
+from app.config import Config
+
+Payload = Union[str, bytes]
+
+DEFAULT_ENCODING = "json"
+COMPRESSIONS = ("deflate",)
+
+
+def dumps(data: Any) -> str:
+    """Serialize data to a JSON string, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+
+def loads(payload: Payload) -> Any:
+    """Parse a JSON string, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def available_encodings() -> list:
+    """Encodings a client can negotiate with the ?encoding= query parameter"""
+    encodings = [DEFAULT_ENCODING]
+    if msgpack is not None:
+        encodings.append("msgpack")
+    return encodings
+
+
+def negotiate_encoding(requested: Optional[str], compression: Optional[str] = None) -> str:
+    """Pick the encoding for a connection, falling back to uncompressed JSON
+    
+    A supported ?compress= value is appended as a suffix, e.g. "json+deflate".
+    """
+    encoding = requested if requested and requested in available_encodings() else DEFAULT_ENCODING
+    if compression in COMPRESSIONS:
+        encoding = f"{encoding}+{compression}"
+    return encoding
+
+
+def deflate(payload: Payload, level: Optional[int] = None) -> bytes:
+    """Compress a payload as a standalone raw deflate stream"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    level = Config.WS_COMPRESSION_LEVEL if level is None else level
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(payload) + compressor.flush()
+
+
+class Frame:
+    """An outbound message serialized at most once per encoding
+    
+    The same encoded payload object is handed to every connection that
+    negotiated that encoding, so fan-out cost no longer scales with the
+    number of clients. Compressed encodings are likewise compressed once.
+    """
+    
+    __slots__ = ("_data", "_encoded", "_variants")
+    
+    def __init__(self, data: Optional[Dict] = None, json_payload: Optional[str] = None):
+        if data is None and json_payload is None:
+            raise ValueError("Frame needs either data or a JSON payload")
+        self._data = data
+        self._encoded: Dict[str, Payload] = {}
+        self._variants: Optional[Dict[str, "Frame"]] = None
+        if json_payload is not None:
+            self._encoded[DEFAULT_ENCODING] = json_payload
+    
+    @classmethod
+    def from_data(cls, data: Dict) -> "Frame":
+        """Build a frame from a message dictionary"""
+        return cls(data=data)
+    
+    @classmethod
+    def from_json(cls, json_payload: str) -> "Frame":
+        """Wrap an already serialized JSON payload without re-encoding it"""
+        return cls(json_payload=json_payload)
+    
+    @property
+    def data(self) -> Dict:
+        """The message dictionary, parsed lazily for JSON-backed frames"""
+        if self._data is None:
+            self._data = loads(self._encoded[DEFAULT_ENCODING])
+        return self._data
+    
+    @property
+    def json(self) -> str:
+        """The JSON payload, as stored in Redis and sent to JSON clients"""
+        return self.encode(DEFAULT_ENCODING)
+    
+    def variant(self, name: str, build: Callable[["Frame"], "Frame"]) -> "Frame":
+        """Return a derived frame, building it on first use like an encoding"""
+        if self._variants is None:
+            self._variants = {}
+        frame = self._variants.get(name)
+        if frame is None:
+            frame = self._variants[name] = build(self)
+        return frame
+    
+    def encode(self, encoding: str = DEFAULT_ENCODING) -> Payload:
+        """Return the payload for an encoding, serializing on first use"""
+        payload = self._encoded.get(encoding)
+        if payload is None:
+            base, _, compression = encoding.partition("+")
+            if compression:
+                payload = deflate(self.encode(base))
+            elif encoding == "msgpack":
+                payload = msgpack.packb(self.data)
+            else:
+                payload = dumps(self.data)
+            self._encoded[encoding] = payload
+        return payload
+
+
+def array_frame(frames: Sequence[Frame]) -> Frame:
+    """Join frames into one JSON array frame without re-encoding them"""
+    return Frame.from_json("[" + ",".join(frame.json for frame in frames) + "]")
+
+
+def batch_frame(json_payloads: Sequence[str], authors: Optional[Dict] = None) -> Frame:
+    """Join already serialized JSON messages into one batch frame without re-encoding"""
+    prefix = '{"type":"batch",'
+    if authors is not None:
+        prefix += '"authors":' + dumps(authors) + ","
+    return Frame.from_json(prefix + '"messages":[' + ",".join(json_payloads) + "]}")
\ No newline at end of file
@@ -0,0 +1,98 @@
+import asyncio
+from typing import List, Optional
+
+from app.config import Config
+from app.database import db_manager
+from app.logging import get_logger
+from app.metrics import DB_COMMIT_LATENCY, INGEST_QUEUE_DEPTH, snowflake_age
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+logger = get_logger()
+
+# Errors worth retrying: dropped connections, failovers, pool exhaustion
+TRANSIENT_DB_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, OSError)
+
+
+class MessageWriter:
+    """Persists ingested messages to Postgres in batches in the background
+    
+    Rows are buffered in a bounded queue, so a slow database applies
+    back-pressure instead of growing memory. Each batch is written as a
+    single multi-row insert that skips already stored messages.
+    """
+    
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=Config.INGEST_QUEUE_SIZE)
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the background writer"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def submit(self, row: dict):
+        """Queue a message row for persistence, waiting if the queue is full"""
+        await self.queue.put(row)
+        INGEST_QUEUE_DEPTH.set(self.queue.qsize())
+    
+    async def stop(self):
+        """Flush everything queued so far and stop the writer"""
+        if self._task is None:
+            return
+        await self.queue.put(None)
+        try:
+            await self._task
+        finally:
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            first = await self.queue.get()
+            if first is not None and self.queue.qsize() < Config.INGEST_BATCH_SIZE - 1:
+                # Linger briefly so bursts are written together
+                await asyncio.sleep(Config.INGEST_FLUSH_INTERVAL)
+            batch = [first] + self._take_batch(Config.INGEST_BATCH_SIZE - 1)
+            INGEST_QUEUE_DEPTH.set(self.queue.qsize())
+            
+            rows = [row for row in batch if row is not None]
+            if rows:
+                await self._write_batch(rows)
+            
+            # A None sentinel means shutdown; exit once the queue is drained
+            if len(rows) < len(batch) and self.queue.empty():
+                return
+    
+    def _take_batch(self, limit: int) -> List[Optional[dict]]:
+        batch = []
+        while len(batch) < limit and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+    
+    async def _write_batch(self, rows: List[dict]):
+        """Insert a batch, retrying transient database errors with backoff"""
+        for attempt in range(Config.INGEST_MAX_RETRIES + 1):
+            try:
+                inserted = await db_manager.insert_messages(rows)
+                for row in rows:
+                    DB_COMMIT_LATENCY.observe(snowflake_age(row["id"]))
+                logger.info("Message batch persisted", 
+                           batch_size=len(rows),
+                           inserted=inserted)
+                return
+            except TRANSIENT_DB_ERRORS as e:
+                delay = min(0.5 * 2 ** attempt, 10)
+                logger.warning("Transient database error, retrying batch", 
+                             attempt=attempt + 1,
+                             delay=delay,
+                             error=str(e))
+                await asyncio.sleep(delay)
+            except Exception as e:
+                logger.error("Failed to persist message batch", 
+                            batch_size=len(rows),
+                            error=str(e))
+                return
+        
+        logger.error("Dropping message batch after retries", 
+                    batch_size=len(rows),
+                    retries=Config.INGEST_MAX_RETRIES)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+from app.config import Config
+from app.logging import get_logger
+
+logger = get_logger()
+
+# Extend the lease only if we still own it. KEYS[1] = lock, ARGV = token, ttl (ms)
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Delete the lock only if we still own it. KEYS[1] = lock, ARGV[1] = token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElector:
+    """Elects a single Discord ingester among workers with a Redis lease
+    
+    Every worker races for the lock; the holder renews it every third of
+    the TTL and standbys retry on the same cadence, so a dead leader is
+    replaced within LEADER_LOCK_TTL seconds.
+    """
+    
+    def __init__(self, redis_client: redis.Redis,
+                 on_elected: Callable[[], Awaitable[None]],
+                 on_demoted: Callable[[], Awaitable[None]]):
+        self.redis = redis_client
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.token = f"{Config.GATEWAY_ID}:{os.getpid()}:{uuid.uuid4().hex}"
+        self.ttl_ms = int(Config.LEADER_LOCK_TTL * 1000)
+        self.is_leader = False
+        self._lease_expires_at = 0.0
+        # After resigning, leave the lock to standbys until this time
+        self._campaign_after = 0.0
+        self._renew = redis_client.register_script(RENEW_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start campaigning for leadership"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop campaigning and hand leadership over immediately"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        if self.is_leader:
+            try:
+                await self._release(keys=[Config.LEADER_LOCK_KEY], args=[self.token])
+            except Exception as e:
+                logger.error("Failed to release leader lock", error=str(e))
+            await self._set_leader(False)
+    
+    async def resign(self):
+        """Give up leadership and stay out of the race for one lease period
+        
+        Used when this worker cannot ingest, so a standby takes over instead
+        of the same worker winning the lock straight back.
+        """
+        if not self.is_leader:
+            return
+        self._campaign_after = time.monotonic() + Config.LEADER_LOCK_TTL
+        try:
+            await self._release(keys=[Config.LEADER_LOCK_KEY], args=[self.token])
+        except Exception as e:
+            logger.error("Failed to release leader lock", error=str(e))
+        await self._set_leader(False)
+    
+    async def _run(self):
+        interval = Config.LEADER_LOCK_TTL / 3
+        while True:
+            try:
+                if self.is_leader:
+                    renewed = await self._renew(keys=[Config.LEADER_LOCK_KEY], args=[self.token, self.ttl_ms])
+                    if renewed:
+                        self._lease_expires_at = time.monotonic() + Config.LEADER_LOCK_TTL
+                    else:
+                        logger.warning("Leader lock lost", token=self.token)
+                        await self._set_leader(False)
+                elif time.monotonic() >= self._campaign_after:
+                    acquired = await self.redis.set(Config.LEADER_LOCK_KEY, self.token, nx=True, px=self.ttl_ms)
+                    if acquired:
+                        self._lease_expires_at = time.monotonic() + Config.LEADER_LOCK_TTL
+                        await self._set_leader(True)
+                        
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Leader election failed", error=str(e))
+                # Step down before the lease can lapse and another worker takes over
+                if self.is_leader and time.monotonic() + interval >= self._lease_expires_at:
+                    await self._set_leader(False)
+            
+            await asyncio.sleep(interval)
+    
+    async def _set_leader(self, is_leader: bool):
+        if is_leader == self.is_leader:
+            return
+        
+        self.is_leader = is_leader
+        logger.info("Ingest leadership changed", 
+                   is_leader=is_leader,
+                   token=self.token)
+        try:
+            await (self.on_elected() if is_leader else self.on_demoted())
+        except Exception as e:
+            logger.error("Leadership change handler failed", is_leader=is_leader, error=str(e))
\ No newline at end of file
@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from app.config import Config
+from app.logging import get_logger
+from app.metrics import EVENT_LOOP_LAG
+
+logger = get_logger()
+
+# Weight of the newest sample in the smoothed figures
+SMOOTHING = 0.3
+
+
+class LoadMonitor:
+    """Tracks how close this gateway is to saturating its event loop
+    
+    Every LOAD_SAMPLE_INTERVAL seconds it measures how late the loop woke
+    up (event-loop lag), the slowest broadcast since the last sample and
+    the mean outbound queue depth per connection, and keeps a smoothed
+    value of each. New connections are refused while any of them is past
+    its threshold.
+    """
+    
+    def __init__(self, queue_depths: Callable[[], Iterable[int]]):
+        self.queue_depths = queue_depths
+        self.loop_lag = 0.0
+        self.broadcast_time = 0.0
+        self.queue_depth = 0.0
+        self.max_queue_depth = 0
+        self._slowest_broadcast = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    def record_broadcast(self, seconds: float):
+        """Report how long one broadcast took to queue"""
+        if seconds > self._slowest_broadcast:
+            self._slowest_broadcast = seconds
+    
+    def overload_reason(self) -> Optional[str]:
+        """Name the first figure past its threshold, or None when accepting"""
+        if self.loop_lag > Config.LOAD_MAX_LOOP_LAG:
+            return "loop_lag"
+        if self.broadcast_time > Config.LOAD_MAX_BROADCAST_TIME:
+            return "broadcast_time"
+        if self.queue_depth > Config.LOAD_MAX_QUEUE_DEPTH:
+            return "queue_depth"
+        return None
+    
+    def retry_after(self) -> int:
+        """Seconds a refused client should wait, jittered so retries spread out"""
+        return round(Config.LOAD_RETRY_AFTER * random.uniform(1, 2))
+    
+    def snapshot(self) -> Dict:
+        """Current figures and thresholds"""
+        reason = self.overload_reason()
+        return {
+            "accepting": reason is None,
+            "reason": reason,
+            "loop_lag": round(self.loop_lag, 4),
+            "broadcast_time": round(self.broadcast_time, 4),
+            "queue_depth": round(self.queue_depth, 2),
+            "max_queue_depth": self.max_queue_depth,
+            "thresholds": {
+                "loop_lag": Config.LOAD_MAX_LOOP_LAG,
+                "broadcast_time": Config.LOAD_MAX_BROADCAST_TIME,
+                "queue_depth": Config.LOAD_MAX_QUEUE_DEPTH,
+            },
+        }
+    
+    def sample(self, lag: float):
+        """Fold one round of measurements into the smoothed figures"""
+        depths = list(self.queue_depths())
+        mean_depth = sum(depths) / len(depths) if depths else 0.0
+        EVENT_LOOP_LAG.set(lag)
+        
+        self.loop_lag += SMOOTHING * (lag - self.loop_lag)
+        self.broadcast_time += SMOOTHING * (self._slowest_broadcast - self.broadcast_time)
+        self.queue_depth += SMOOTHING * (mean_depth - self.queue_depth)
+        self.max_queue_depth = max(depths, default=0)
+        self._slowest_broadcast = 0.0
+    
+    def start(self):
+        """Start sampling"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop sampling"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        interval = Config.LOAD_SAMPLE_INTERVAL
+        accepting = True
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            # Anything past the requested sleep is time the loop was busy elsewhere
+            self.sample(max(0.0, time.monotonic() - started - interval))
+            
+            reason = self.overload_reason()
+            if accepting != (reason is None):
+                accepting = reason is None
+                logger.warning("Admission state changed",
+                              accepting=accepting,
+                              reason=reason,
+                              loop_lag=round(self.loop_lag, 4),
+                              broadcast_time=round(self.broadcast_time, 4),
+                              queue_depth=round(self.queue_depth, 2))
\ No newline at end of file
@@ -0,0 +1,66 @@
+from collections import deque
+from typing import Iterable, Iterator, List, Optional
+
+from app.config import Config
+from app.encoding import Frame
+
+RECENT_MESSAGES_KEY = "recent_messages"
+
+
+def recent_messages_key(channel_id=None) -> str:
+    """Redis list holding the recent history of a channel, or of every channel"""
+    if channel_id is None:
+        return RECENT_MESSAGES_KEY
+    return f"{RECENT_MESSAGES_KEY}:{channel_id}"
+
+
+class RecentMessageBuffer:
+    """Bounded in-process ring buffer of the most recent message frames"""
+    
+    def __init__(self, maxlen: int = Config.MESSAGE_HISTORY_LIMIT):
+        self.frames: deque = deque(maxlen=maxlen)
+    
+    def __len__(self) -> int:
+        return len(self.frames)
+    
+    def __iter__(self) -> Iterator[Frame]:
+        """Iterate frames oldest first"""
+        return iter(self.frames)
+    
+    def append(self, frame: Frame):
+        """Add the newest frame, evicting the oldest once full"""
+        self.frames.append(frame)
+    
+    def extend(self, frames: Iterable[Frame]):
+        """Add frames given oldest first"""
+        self.frames.extend(frames)
+    
+    def merge(self, frames: Iterable[Frame]):
+        """Insert older frames in snowflake order, skipping messages already buffered
+        
+        Keeps the newest frames once full, so frames older than everything
+        in a full buffer are dropped.
+        """
+        buffered = {frame.data.get("id") for frame in self.frames}
+        added = [frame for frame in frames if frame.data.get("id") not in buffered]
+        if not added:
+            return
+        merged = sorted([*self.frames, *added], key=lambda frame: int(frame.data.get("id", 0)))
+        self.frames = deque(merged[-self.frames.maxlen:], maxlen=self.frames.maxlen)
+    
+    def apply(self, delta: dict):
+        """Apply an edit or delete delta to the buffered message it targets"""
+        for index, frame in enumerate(self.frames):
+            if frame.data.get("id") == delta["id"]:
+                if delta["op"] == "delete":
+                    del self.frames[index]
+                else:
+                    self.frames[index] = Frame.from_data({**frame.data, "content": delta["content"]})
+                return
+    
+    def latest(self, limit: Optional[int] = None) -> List[Frame]:
+        """Return up to limit frames, newest first"""
+        frames = reversed(self.frames)
+        if limit is None:
+            return list(frames)
+        return [frame for _, frame in zip(range(limit), frames)]
\ No newline at end of file
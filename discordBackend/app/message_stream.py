@@ -0,0 +1,301 @@
+import asyncio
+import time
+from typing import List, Optional
+
+import redis.asyncio as redis
+from app.config import Config
+from app.encoding import Frame, dumps, loads
+from app.logging import get_logger
+from app.message_cache import recent_messages_key
+from app.metrics import REDIS_LATENCY
+from app.websocket_manager import WebSocketManager
+
+logger = get_logger()
+
+MINUTE_COUNTER_PREFIX = "messages_per_minute"
+MINUTE_COUNTER_TTL = 3660  # seconds; an hour of buckets plus slack
+
+# Record one message with a single round trip: assign its sequence number,
+# splice it into the pre-serialized payload, update the history lists, the
+# replay log and the per-minute counter, and append to the fan-out stream.
+# KEYS: seq counter, recent list, replay log, minute counter, stream,
+#       channel recent list
+# ARGV: payload without seq, history limit, replay limit, counter TTL,
+#       stream maxlen (0 = in-process fan-out, skip the stream)
+PUBLISH_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+local frame = '{"seq":' .. seq .. ',' .. string.sub(ARGV[1], 2)
+redis.call('LPUSH', KEYS[2], frame)
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[2]) - 1)
+if KEYS[6] ~= KEYS[2] then
+    redis.call('LPUSH', KEYS[6], frame)
+    redis.call('LTRIM', KEYS[6], 0, tonumber(ARGV[2]) - 1)
+end
+redis.call('ZADD', KEYS[3], seq, frame)
+redis.call('ZREMRANGEBYRANK', KEYS[3], 0, -tonumber(ARGV[3]) - 1)
+redis.call('INCR', KEYS[4])
+redis.call('EXPIRE', KEYS[4], ARGV[4])
+if tonumber(ARGV[5]) > 0 then
+    redis.call('XADD', KEYS[5], 'MAXLEN', '~', ARGV[5], '*', 'frame', frame)
+end
+return seq
+"""
+
+
+# Record an edit or delete delta: assign it a sequence number, append it to
+# the replay log and the fan-out stream, and patch the cached copy of the
+# target message in each history list (rewrite its content, or remove it).
+# KEYS: seq counter, replay log, stream, recent lists...
+# ARGV: payload without seq, replay limit, stream maxlen (0 = skip),
+#       op, message id, new content
+DELTA_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+local frame = '{"seq":' .. seq .. ',' .. string.sub(ARGV[1], 2)
+redis.call('ZADD', KEYS[2], seq, frame)
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+if tonumber(ARGV[3]) > 0 then
+    redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[3], '*', 'frame', frame)
+end
+local compact = '"id":"' .. ARGV[5] .. '"'
+local spaced = '"id": "' .. ARGV[5] .. '"'
+for k = 4, #KEYS do
+    for index, entry in ipairs(redis.call('LRANGE', KEYS[k], 0, -1)) do
+        if string.find(entry, compact, 1, true) or string.find(entry, spaced, 1, true) then
+            if ARGV[4] == 'delete' then
+                redis.call('LREM', KEYS[k], 1, entry)
+            else
+                local message = cjson.decode(entry)
+                message['content'] = ARGV[6]
+                redis.call('LSET', KEYS[k], index - 1, cjson.encode(message))
+            end
+            break
+        end
+    end
+end
+return seq
+"""
+
+
+# Merge backfilled messages into history lists without publishing them:
+# messages whose ID is already cached are skipped, and each list is rebuilt
+# newest first by snowflake ID and trimmed, so live messages cached while
+# the backfill ran keep their place. Snowflakes exceed Lua's exact number
+# range, so IDs are compared as digit strings.
+# KEYS: recent lists
+# ARGV: history limit, payloads...
+# Returns the number of messages added to the last list
+REHYDRATE_SCRIPT = """
+local function newer(a, b)
+    if #a ~= #b then
+        return #a > #b
+    end
+    return a > b
+end
+local added = 0
+for k = 1, #KEYS do
+    local seen = {}
+    local merged = {}
+    for _, entry in ipairs(redis.call('LRANGE', KEYS[k], 0, -1)) do
+        local id = tostring(cjson.decode(entry)['id'] or '')
+        seen[id] = true
+        table.insert(merged, {id, entry})
+    end
+    added = 0
+    for i = 2, #ARGV do
+        local id = tostring(cjson.decode(ARGV[i])['id'])
+        if not seen[id] then
+            seen[id] = true
+            table.insert(merged, {id, ARGV[i]})
+            added = added + 1
+        end
+    end
+    if added > 0 then
+        table.sort(merged, function(a, b) return newer(a[1], b[1]) end)
+        redis.call('DEL', KEYS[k])
+        for i = 1, math.min(#merged, tonumber(ARGV[1])) do
+            redis.call('RPUSH', KEYS[k], merged[i][2])
+        end
+    end
+end
+return added
+"""
+
+
+def minute_counter_key(timestamp: float) -> str:
+    """Key of the per-minute message counter covering timestamp"""
+    return f"{MINUTE_COUNTER_PREFIX}:{int(timestamp) // 60}"
+
+
+def last_hour_counter_keys(now: Optional[float] = None) -> List[str]:
+    """Keys of the 60 per-minute counters making up the last hour"""
+    minute = int(now if now is not None else time.time()) // 60
+    return [f"{MINUTE_COUNTER_PREFIX}:{minute - offset}" for offset in range(60)]
+
+
+class MessageStream:
+    """Fans messages out to every gateway instance through a Redis Stream
+    
+    The ingest side appends each frame to the stream; every gateway runs a
+    consumer that feeds its local WebSocketManager and records the last
+    delivered entry ID so a restarted gateway resumes where it left off.
+    """
+    
+    def __init__(self, redis_client: redis.Redis, websocket_manager: WebSocketManager):
+        self.redis = redis_client
+        self.websocket_manager = websocket_manager
+        self.offset_key = f"{Config.MESSAGE_STREAM_KEY}:offset:{Config.GATEWAY_ID}"
+        self._publish = redis_client.register_script(PUBLISH_SCRIPT)
+        self._publish_delta = redis_client.register_script(DELTA_SCRIPT)
+        self._rehydrate = redis_client.register_script(REHYDRATE_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+    
+    async def publish(self, message_data: dict) -> Frame:
+        """Record a message in the Redis caches and publish it to every gateway
+        
+        All Redis writes happen in one script call. The returned frame holds
+        the exact payload stored in Redis, including its sequence number.
+        """
+        payload = dumps(message_data)
+        stream_maxlen = Config.MESSAGE_STREAM_MAXLEN if Config.MESSAGE_STREAM_ENABLED else 0
+        with REDIS_LATENCY.labels("publish").time():
+            seq = await self._publish(
+                keys=[
+                    "message_seq",
+                    recent_messages_key(),
+                    "message_log",
+                    minute_counter_key(time.time()),
+                    Config.MESSAGE_STREAM_KEY,
+                    recent_messages_key(message_data.get("channel_id")),
+                ],
+                args=[
+                    payload,
+                    Config.MESSAGE_HISTORY_LIMIT,
+                    Config.MESSAGE_REPLAY_LIMIT,
+                    MINUTE_COUNTER_TTL,
+                    stream_maxlen,
+                ]
+            )
+        frame = Frame(data={"seq": seq, **message_data}, json_payload=f'{{"seq":{seq},{payload[1:]}')
+        
+        if not Config.MESSAGE_STREAM_ENABLED:
+            await self.websocket_manager.broadcast_message(frame)
+        return frame
+    
+    async def publish_delta(self, delta: dict) -> Frame:
+        """Publish an edit or delete of an earlier message to every gateway
+        
+        Deltas carry only what changed: {"op": "edit", "id", "channel_id",
+        "content"} or {"op": "delete", "id", "channel_id"}. They are
+        sequenced and replayed like messages, and the cached history is
+        patched in place in the same script call.
+        """
+        payload = dumps(delta)
+        stream_maxlen = Config.MESSAGE_STREAM_MAXLEN if Config.MESSAGE_STREAM_ENABLED else 0
+        with REDIS_LATENCY.labels("publish_delta").time():
+            seq = await self._publish_delta(
+                keys=[
+                    "message_seq",
+                    "message_log",
+                    Config.MESSAGE_STREAM_KEY,
+                    recent_messages_key(),
+                    recent_messages_key(delta["channel_id"]),
+                ],
+                args=[
+                    payload,
+                    Config.MESSAGE_REPLAY_LIMIT,
+                    stream_maxlen,
+                    delta["op"],
+                    delta["id"],
+                    delta.get("content", ""),
+                ]
+            )
+        frame = Frame(data={"seq": seq, **delta}, json_payload=f'{{"seq":{seq},{payload[1:]}')
+        
+        if not Config.MESSAGE_STREAM_ENABLED:
+            await self.websocket_manager.broadcast_message(frame)
+        return frame
+    
+    async def rehydrate(self, channel_id, messages: List[dict]) -> int:
+        """Merge older messages into the cached history without broadcasting them
+        
+        Used for backfilled messages, which connected clients should not
+        receive as new. They get no sequence number and are not counted;
+        messages already cached are skipped. Every gateway then merges them
+        into its in-process buffers through a history entry on the stream.
+        Returns how many were added to the channel's list.
+        """
+        if not messages:
+            return 0
+        payloads = [dumps(message) for message in messages]
+        with REDIS_LATENCY.labels("rehydrate").time():
+            added = await self._rehydrate(
+                keys=[recent_messages_key(), recent_messages_key(channel_id)],
+                args=[Config.MESSAGE_HISTORY_LIMIT, *payloads]
+            )
+        
+        if Config.MESSAGE_STREAM_ENABLED:
+            await self.redis.xadd(Config.MESSAGE_STREAM_KEY, {"history": "[" + ",".join(payloads) + "]"},
+                                  maxlen=Config.MESSAGE_STREAM_MAXLEN, approximate=True)
+        else:
+            self.websocket_manager.merge_history([Frame.from_json(payload) for payload in payloads])
+        return added
+    
+    def start(self):
+        """Start consuming the stream into the local WebSocket manager"""
+        if Config.MESSAGE_STREAM_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._consume())
+    
+    async def stop(self):
+        """Stop the stream consumer"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _get_start_offset(self) -> str:
+        """Resume from the stored offset, or from the current stream tail"""
+        offset = await self.redis.get(self.offset_key)
+        if offset:
+            return offset
+        
+        latest = await self.redis.xrevrange(Config.MESSAGE_STREAM_KEY, count=1)
+        return latest[0][0] if latest else "0-0"
+    
+    async def _consume(self):
+        last_id = None
+        while True:
+            try:
+                if last_id is None:
+                    last_id = await self._get_start_offset()
+                    logger.info("Message stream consumer started", 
+                               gateway_id=Config.GATEWAY_ID,
+                               offset=last_id)
+                
+                entries = await self.redis.xread(
+                    {Config.MESSAGE_STREAM_KEY: last_id},
+                    count=Config.MESSAGE_STREAM_BATCH_SIZE,
+                    block=Config.MESSAGE_STREAM_BLOCK_MS
+                )
+                if not entries:
+                    continue
+                
+                for _stream, messages in entries:
+                    for entry_id, fields in messages:
+                        if "history" in fields:
+                            # Backfilled messages: history for new clients, not news for connected ones
+                            self.websocket_manager.merge_history(
+                                [Frame.from_data(message) for message in loads(fields["history"])])
+                        else:
+                            await self.websocket_manager.broadcast_message(Frame.from_json(fields["frame"]))
+                        last_id = entry_id
+                
+                await self.redis.set(self.offset_key, last_id)
+                
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Message stream consumer failed", error=str(e))
+                await asyncio.sleep(1)
\ No newline at end of file
@@ -0,0 +1,101 @@
+import os
+import time
+
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+DISCORD_EPOCH_MS = 1420070400000
+
+# Seconds; spans sub-millisecond Redis calls to multi-second ingest backlogs
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+MESSAGE_LATENCY = Histogram(
+    "discord_message_latency_seconds",
+    "Time from a message's Discord creation to each pipeline stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+BROADCAST_DURATION = Histogram(
+    "websocket_broadcast_duration_seconds",
+    "Time to queue one broadcast for every subscriber",
+    buckets=LATENCY_BUCKETS,
+)
+SEND_FAILURES = Counter(
+    "websocket_send_failures_total",
+    "Deliveries abandoned because a client fell behind or its socket failed",
+    ["reason"],
+)
+REDIS_LATENCY = Histogram(
+    "redis_call_duration_seconds",
+    "Redis round-trip time",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_LATENCY = Histogram(
+    "db_call_duration_seconds",
+    "Database statement time, including pool checkout",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=LATENCY_BUCKETS,
+)
+INGEST_QUEUE_DEPTH = Gauge(
+    "ingest_queue_depth",
+    "Message rows waiting for the background database writer",
+    multiprocess_mode="livesum",
+)
+EVENT_LOOP_LAG = Gauge(
+    "event_loop_lag_seconds",
+    "How late the event loop woke for the last load sample",
+    multiprocess_mode="livemax",
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "websocket_connections",
+    "Open WebSocket connections",
+    multiprocess_mode="livesum",
+)
+CONNECTIONS_OPENED = Counter(
+    "websocket_connections_opened_total",
+    "WebSocket connections accepted",
+)
+CONNECTIONS_CLOSED = Counter(
+    "websocket_connections_closed_total",
+    "WebSocket connections removed",
+)
+
+# Stage children resolved once; labels() is a dictionary lookup per call
+RECEIVE_LATENCY = MESSAGE_LATENCY.labels("received")
+DB_COMMIT_LATENCY = MESSAGE_LATENCY.labels("db_commit")
+BROADCAST_LATENCY = MESSAGE_LATENCY.labels("broadcast")
+
+
+def render() -> bytes:
+    """Metrics in the text exposition format
+    
+    With PROMETHEUS_MULTIPROC_DIR set, every worker writes its samples
+    there and any worker answering a scrape reports them all combined.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the combined metrics on shutdown"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def snowflake_time(snowflake: int) -> float:
+    """Unix time a Discord snowflake was created"""
+    return ((snowflake >> 22) + DISCORD_EPOCH_MS) / 1000
+
+
+def snowflake_age(snowflake: int) -> float:
+    """Seconds since a Discord snowflake was created"""
+    return time.time() - snowflake_time(snowflake)
\ No newline at end of file
@@ -1,36 +1,67 @@
-import uuid
-from datetime import datetime
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
-from sqlalchemy import Column, DateTime, String, Text
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Column, DateTime, Index, String, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 
 # SQLAlchemy Base
 Base = declarative_base()
 
 
 class Message(Base):
-    """Database model for Discord messages"""
+    """Database model for Discord messages
+    
+    Discord snowflakes are time-ordered, so the message ID doubles as an
+    append-only primary key. The table is range-partitioned by created_at
+    (see app/partitions.py), which Postgres requires to be part of the key.
+    Fixed-width columns come first to avoid alignment padding.
+    """
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_channel_created", "channel_id", "created_at"),
+        Index("ix_messages_author_created", "author_id", "created_at"),
+        Index("ix_messages_content_tsv", "content_tsv", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    discord_message_id = Column(String, unique=True, nullable=False)
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    channel_id = Column(BigInteger, nullable=False)
+    guild_id = Column(BigInteger, nullable=False)
+    author_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, primary_key=True)
+    processed_at = Column(DateTime, default=datetime.utcnow)
     author_name = Column(String, nullable=False)
-    author_id = Column(String, nullable=False)
     avatar_url = Column(String)
     content = Column(Text, nullable=False)
-    channel_id = Column(String, nullable=False)
-    guild_id = Column(String, nullable=False)
-    created_at = Column(DateTime, nullable=False)
-    processed_at = Column(DateTime, default=datetime.utcnow)
+    # Filled from content at insert time by DatabaseManager.insert_messages;
+    # deferred so ordinary reads do not load it
+    content_tsv = deferred(Column(TSVECTOR))
+    
+    def to_message_data(self) -> dict:
+        """Shape the row like a broadcast message frame"""
+        created_at = self.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return {
+            "id": str(self.id),
+            "channel_id": str(self.channel_id),
+            "author": self.author_name,
+            "author_id": str(self.author_id),
+            "avatar": self.avatar_url or "",
+            "content": self.content,
+            "timestamp": created_at.isoformat()
+        }
 
 
 # Pydantic Models for API responses
 class MessageResponse(BaseModel):
     """Pydantic model for message API responses"""
+    seq: Optional[int] = None
     id: str
+    channel_id: Optional[str] = None
     author: str
     author_id: str
     avatar: str
@@ -38,6 +69,17 @@ class MessageResponse(BaseModel):
     timestamp: datetime
 
 
+class SearchResult(MessageResponse):
+    """Pydantic model for a ranked search hit"""
+    rank: float
+
+
+class SearchResponse(BaseModel):
+    """Pydantic model for a page of search results"""
+    results: List[SearchResult]
+    next_cursor: Optional[str] = None
+
+
 class HealthCheck(BaseModel):
     """Pydantic model for health check responses"""
     status: str
@@ -46,8 +88,37 @@ class HealthCheck(BaseModel):
     components: Dict[str, str]
 
 
+class LoadStatus(BaseModel):
+    """Pydantic model for the admission-control figures"""
+    accepting: bool
+    reason: Optional[str] = None
+    loop_lag: float
+    broadcast_time: float
+    queue_depth: float
+    max_queue_depth: int
+    connections: int
+    thresholds: Dict[str, float]
+
+
+class ConnectionInfo(BaseModel):
+    """Pydantic model for a single WebSocket connection's metrics"""
+    connection_id: str
+    client_ip: str
+    encoding: str
+    channels: Optional[List[str]] = None
+    connected_at: datetime
+    bytes_sent: int
+    messages_sent: int
+    queued: int
+    lag: float
+
+
 class ConnectionStats(BaseModel):
     """Pydantic model for connection statistics"""
     total_connections: int
     connections_by_ip: Dict[str, int]
-    messages_sent_last_hour: int 
\ No newline at end of file
+    messages_sent_last_hour: int
+    bytes_sent: int = 0
+    frames_sent: int = 0
+    database_pool: Dict[str, float] = {}
+    connections: Optional[List[ConnectionInfo]] = None 
\ No newline at end of file
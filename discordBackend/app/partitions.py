@@ -0,0 +1,163 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from app.config import Config
+from app.database import db_manager
+from app.logging import get_logger
+from sqlalchemy import text
+
+logger = get_logger()
+
+PARENT_TABLE = "messages"
+
+# Serializes maintenance across workers and replicas
+MAINTENANCE_LOCK_ID = 7305911  # arbitrary, unique to this job
+
+PARTITION_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+LIST_PARTITIONS = text("""
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = :parent
+""")
+
+
+def partition_start(moment: datetime) -> datetime:
+    """Start of the partition interval containing moment"""
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if Config.MESSAGE_PARTITION_INTERVAL == "weekly":
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def partition_step() -> timedelta:
+    return timedelta(weeks=1) if Config.MESSAGE_PARTITION_INTERVAL == "weekly" else timedelta(days=1)
+
+
+def uncovered_ranges(start: datetime, end: datetime,
+                     existing: List[Tuple[str, datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """Parts of [start, end) that no existing partition covers
+    
+    After MESSAGE_PARTITION_INTERVAL changes, a new range can partly
+    overlap partitions made under the old interval; only the gaps are left
+    to create.
+    """
+    gaps = []
+    cursor = start
+    for _, lower, upper in sorted(existing, key=lambda partition: partition[1]):
+        if upper <= cursor or lower >= end:
+            continue
+        if lower > cursor:
+            gaps.append((cursor, lower))
+        cursor = max(cursor, upper)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def plan_partitions(now: datetime, existing: List[Tuple[str, datetime, datetime]]
+                    ) -> Tuple[List[Tuple[str, datetime, datetime]], List[str]]:
+    """Partitions to create and to retire, given the existing ones
+    
+    Creates cover everything from the retention cutoff to
+    MESSAGE_PARTITION_PREMAKE intervals past the current one. Gaps that end
+    before the cutoff are skipped; they would be retired straight away.
+    """
+    retention_cutoff = now - timedelta(seconds=Config.MESSAGE_TTL)
+    step = partition_step()
+    existing = list(existing)
+    
+    to_create = []
+    start = partition_start(retention_cutoff)
+    horizon = partition_start(now) + step * (Config.MESSAGE_PARTITION_PREMAKE + 1)
+    while start < horizon:
+        end = start + step
+        for lower, upper in uncovered_ranges(start, end, existing):
+            if upper <= retention_cutoff:
+                continue
+            partition = (f"{PARENT_TABLE}_p{lower:%Y%m%d}", lower, upper)
+            existing.append(partition)
+            to_create.append(partition)
+        start = end
+    
+    to_retire = [name for name, _, upper in existing if upper <= retention_cutoff]
+    return to_create, to_retire
+
+
+class PartitionMaintainer:
+    """Keeps the time-partitioned messages table ready and within retention
+    
+    Upcoming partitions are created ahead of time, and partitions that end
+    before the MESSAGE_TTL retention window are dropped (or detached), so
+    expiring old messages is a metadata operation rather than a DELETE.
+    """
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start periodic maintenance"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop periodic maintenance"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def run_once(self):
+        """Create upcoming partitions and retire expired ones"""
+        async with db_manager.connection("partition_maintenance") as connection:
+            async with connection.begin():
+                await connection.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"),
+                                         {"lock_id": MAINTENANCE_LOCK_ID})
+                existing = await self._list_partitions(connection)
+                to_create, retired = plan_partitions(datetime.utcnow(), existing)
+                
+                for name, lower, upper in to_create:
+                    await connection.execute(text(
+                        f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} "
+                        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+                    ))
+                created = [name for name, _, _ in to_create]
+                
+                for name in retired:
+                    if Config.MESSAGE_RETENTION_ACTION == "detach":
+                        await connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+                    else:
+                        await connection.execute(text(f"DROP TABLE {name}"))
+        
+        if created or retired:
+            logger.info("Message partitions maintained", 
+                       created=created,
+                       retired=retired,
+                       retention_action=Config.MESSAGE_RETENTION_ACTION)
+    
+    async def _list_partitions(self, connection) -> List[Tuple[str, datetime, datetime]]:
+        result = await connection.execute(LIST_PARTITIONS, {"parent": PARENT_TABLE})
+        partitions = []
+        for name, bound in result:
+            match = PARTITION_BOUNDS.search(bound or "")
+            if match:
+                lower, upper = (datetime.fromisoformat(value) for value in match.groups())
+                partitions.append((name, lower, upper))
+        return partitions
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(Config.MESSAGE_PARTITION_MAINTENANCE_INTERVAL)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Partition maintenance failed", error=str(e))
\ No newline at end of file
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import redis.asyncio as redis
+from app.config import Config
+from app.logging import get_logger
+
+logger = get_logger()
+
+# Atomically add this instance's consumption to the shared window usage,
+# kept per instance so the number of instances serving the key is known.
+# KEYS[1] = usage hash, ARGV[1] = instance ID, ARGV[2] = tokens used locally,
+# ARGV[3] = window (s)
+# Returns total used and the number of instances using the key
+RECONCILE_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if redis.call('TTL', KEYS[1]) < 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+local used = 0
+for _, value in ipairs(redis.call('HVALS', KEYS[1])) do
+    used = used + tonumber(value)
+end
+return {used, redis.call('HLEN', KEYS[1])}
+"""
+
+# Register this instance as live and count the live ones.
+# KEYS[1] = instance set, ARGV[1] = instance ID, ARGV[2] = now (s),
+# ARGV[3] = seconds after which a silent instance is forgotten
+INSTANCES_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[2]) - tonumber(ARGV[3]))
+return redis.call('ZCARD', KEYS[1])
+"""
+
+USAGE_KEY_PREFIX = "rate_limit_usage"
+INSTANCES_KEY = "rate_limit_instances"
+
+
+class TokenBucketRateLimiter:
+    """In-process token-bucket rate limiter keyed by client IP
+    
+    Checks never leave the process. When a sync interval is configured,
+    local consumption is periodically folded into a shared Redis window
+    with a Lua script so the limit also holds across gateway instances:
+    each instance refills a key's bucket at its share of the rate (split
+    between the instances that used the key in the current window) and is
+    capped at its share of what the window has left. Keys not yet
+    reconciled start with a share of the live instances, so a burst spread
+    over every instance stays within one bucket's capacity.
+    """
+    
+    def __init__(self, redis_client: Optional[redis.Redis],
+                 capacity: int = Config.RATE_LIMIT_MAX_REQUESTS,
+                 window: int = Config.RATE_LIMIT_WINDOW,
+                 sync_interval: float = Config.RATE_LIMIT_SYNC_INTERVAL,
+                 instance_id: Optional[str] = None):
+        self.redis = redis_client
+        self.capacity = capacity
+        self.window = window
+        self.refill_rate = capacity / window
+        self.sync_interval = sync_interval
+        # Workers on one host share GATEWAY_ID but each has its own buckets
+        self.instance_id = instance_id or f"{Config.GATEWAY_ID}:{os.getpid()}"
+        # key -> [tokens, last refill timestamp, share of the limit]
+        self.buckets: Dict[str, List[float]] = {}
+        self.pending: Dict[str, int] = {}
+        # Share for keys not reconciled yet: one over the live instances
+        self.default_share = 1.0
+        self._script = redis_client.register_script(RECONCILE_SCRIPT) if redis_client else None
+        self._instances_script = redis_client.register_script(INSTANCES_SCRIPT) if redis_client else None
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def sync_enabled(self) -> bool:
+        return self._script is not None and self.sync_interval > 0
+    
+    def allow(self, key: str) -> bool:
+        """Consume a token for key, returning False when the bucket is empty"""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            share = self.default_share
+            bucket = self.buckets[key] = [self.capacity * share, now, share]
+        else:
+            tokens, updated_at, share = bucket
+            bucket[0] = min(self.capacity * share, tokens + (now - updated_at) * self.refill_rate * share)
+            bucket[1] = now
+        
+        if bucket[0] < 1:
+            return False
+        
+        bucket[0] -= 1
+        if self.sync_enabled:
+            self.pending[key] = self.pending.get(key, 0) + 1
+        return True
+    
+    async def reconcile(self):
+        """Push local consumption to Redis and adopt the shared totals"""
+        pending, self.pending = self.pending, {}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            await self._instances_script(
+                keys=[INSTANCES_KEY],
+                args=[self.instance_id, time.time(), self.sync_interval * 3],
+                client=pipe
+            )
+            for key, used in pending.items():
+                await self._script(keys=[f"{USAGE_KEY_PREFIX}:{key}"],
+                                   args=[self.instance_id, used, self.window], client=pipe)
+            results = await pipe.execute()
+        
+        self.default_share = 1 / max(1, int(results[0]))
+        for key, (global_used, instances) in zip(pending, results[1:]):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            share = 1 / max(1, int(instances))
+            remaining = self.capacity - int(global_used)
+            bucket[2] = share
+            bucket[0] = min(bucket[0], max(0.0, remaining * share))
+    
+    def prune(self):
+        """Forget buckets that have refilled completely"""
+        now = time.monotonic()
+        idle = [
+            key for key, (tokens, updated_at, share) in self.buckets.items()
+            if key not in self.pending
+            and tokens + (now - updated_at) * self.refill_rate * share >= self.capacity * share
+        ]
+        for key in idle:
+            del self.buckets[key]
+    
+    def start(self):
+        """Start the background reconcile/prune loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        interval = self.sync_interval if self.sync_enabled else self.window
+        if self.sync_enabled:
+            # Register before the first burst so new keys start with a fair share
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error("Rate limit reconciliation failed", error=str(e))
+        while True:
+            await asyncio.sleep(interval)
+            if self.sync_enabled:
+                try:
+                    await self.reconcile()
+                except Exception as e:
+                    logger.error("Rate limit reconciliation failed", error=str(e))
+            self.prune()
\ No newline at end of file
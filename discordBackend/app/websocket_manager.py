@@ -1,25 +1,294 @@
 import asyncio
-import json
+import heapq
+import math
 import time
 import uuid
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import redis.asyncio as redis
+from app.authors import AuthorTable, compact_frame
 from app.config import Config
+from app.database import db_manager
+from app.encoding import (Frame, Payload, array_frame, batch_frame, loads,
+                          negotiate_encoding)
+from app.load_monitor import LoadMonitor
 from app.logging import get_logger
+from app.message_cache import RecentMessageBuffer, recent_messages_key
+from app.metrics import (BROADCAST_DURATION, BROADCAST_LATENCY,
+                         CONNECTIONS_CLOSED, CONNECTIONS_OPENED, REDIS_LATENCY,
+                         SEND_FAILURES, WEBSOCKET_CONNECTIONS, snowflake_time)
+from app.rate_limiter import TokenBucketRateLimiter
 from fastapi import WebSocket, WebSocketDisconnect
 
 logger = get_logger()
 
+HEARTBEAT_FRAME = Frame.from_data({"type": "heartbeat"})
+RESYNC_FRAME = Frame.from_data({"type": "resync"})
+
+
+class TrafficTotals:
+    """Running totals shared by every connection of a manager"""
+    
+    __slots__ = ("bytes_sent", "messages_sent")
+    
+    def __init__(self):
+        self.bytes_sent = 0
+        self.messages_sent = 0
+
+
+class ClientConnection:
+    """A WebSocket client with its own bounded outbound queue and writer task"""
+    
+    __slots__ = (
+        "connection_id", "websocket", "client_ip", "encoding", "on_slow", "totals",
+        "queue", "writer_task", "connected_at", "bytes_sent", "messages_sent",
+        "lag", "is_closed", "channels", "known_authors", "accepts_arrays",
+        "last_seen", "replayed_seq", "resync_pending",
+    )
+    
+    def __init__(self, connection_id: str, websocket: WebSocket, encoding: str,
+                 on_slow: Callable[["ClientConnection", str], None],
+                 totals: TrafficTotals):
+        self.connection_id = connection_id
+        self.websocket = websocket
+        self.client_ip = websocket.client.host
+        self.encoding = encoding
+        self.on_slow = on_slow
+        self.totals = totals
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=Config.WS_SEND_QUEUE_SIZE)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.lag = 0.0
+        self.is_closed = False
+        # Subscribed channel IDs; None receives every channel
+        self.channels: Optional[Set[str]] = None
+        # Author profile frames this client holds, by author ID; None when
+        # the client takes profiles inline in every message
+        self.known_authors: Optional[Dict[str, Frame]] = None
+        # Whether coalesced messages may arrive as one JSON array frame
+        self.accepts_arrays = False
+        # Highest seq covered by the replay sent on resume; live frames up to
+        # it are already queued and are dropped
+        self.replayed_seq = 0
+        # A resync frame is queued but not yet sent
+        self.resync_pending = False
+    
+    def start(self):
+        """Start the writer task that drains the outbound queue"""
+        self.writer_task = asyncio.create_task(self._writer())
+    
+    def enqueue(self, payload: Payload, created_at: Optional[float] = None) -> bool:
+        """Queue a payload for delivery, returning False if the queue is full
+        
+        created_at is the Discord creation time of the oldest live message
+        in the payload; its end-to-end latency is recorded once it is sent.
+        """
+        if self.is_closed:
+            return False
+        try:
+            self.queue.put_nowait((time.monotonic(), payload, created_at))
+            return True
+        except asyncio.QueueFull:
+            return False
+    
+    def send_frame(self, frame: Frame, created_at: Optional[float] = None) -> bool:
+        """Queue a frame in this connection's negotiated encoding"""
+        return self.enqueue(frame.encode(self.encoding), created_at)
+    
+    def resync(self):
+        """Discard everything pending and tell the client to resynchronise"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        if self.known_authors is not None:
+            # Discarded author frames may never have reached the client
+            self.known_authors = {}
+        self.resync_pending = self.send_frame(RESYNC_FRAME)
+    
+    def get_info(self) -> dict:
+        """Snapshot of this connection's delivery metrics"""
+        return {
+            "connection_id": self.connection_id,
+            "client_ip": self.client_ip,
+            "encoding": self.encoding,
+            "channels": sorted(self.channels) if self.channels is not None else None,
+            "connected_at": datetime.fromtimestamp(self.connected_at, tz=timezone.utc),
+            "bytes_sent": self.bytes_sent,
+            "messages_sent": self.messages_sent,
+            "queued": self.queue.qsize(),
+            "lag": round(self.lag, 3),
+        }
+    
+    def close(self, code: int, reason: str):
+        """Stop delivery and close the socket without blocking the caller"""
+        if self.is_closed:
+            return
+        self.is_closed = True
+        self.stop()
+        asyncio.create_task(self._close_socket(code, reason))
+    
+    def stop(self):
+        """Cancel the writer task"""
+        self.is_closed = True
+        if self.writer_task and self.writer_task is not asyncio.current_task():
+            self.writer_task.cancel()
+    
+    async def _close_socket(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+    
+    async def _writer(self):
+        """Send queued frames in order, reporting clients that fall behind"""
+        try:
+            while not self.is_closed:
+                enqueued_at, payload, created_at = await self.queue.get()
+                self.lag = time.monotonic() - enqueued_at
+                is_resync = payload is RESYNC_FRAME.encode(self.encoding)
+                if self.lag > Config.WS_MAX_SEND_LAG and not is_resync:
+                    self.on_slow(self, "lag")
+                    continue
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+                if is_resync:
+                    self.resync_pending = False
+                if created_at is not None:
+                    BROADCAST_LATENCY.observe(time.time() - created_at)
+                
+                # Text frames are counted in characters to avoid re-encoding per send
+                self.bytes_sent += len(payload)
+                self.messages_sent += 1
+                self.totals.bytes_sent += len(payload)
+                self.totals.messages_sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            SEND_FAILURES.labels("error").inc()
+            logger.warning("Failed to send message to client", 
+                         connection_id=self.connection_id,
+                         error=str(e))
+            self.close(code=1011, reason="Send failed")
+
+
+class HeartbeatWheel:
+    """One timer for every connection's heartbeat and idle timeout
+    
+    Connections are spread over WS_HEARTBEAT_INTERVAL / WS_HEARTBEAT_TICK
+    slots by when they joined. Each tick visits one slot, so every
+    connection is checked once per interval without a timer of its own:
+    clients silent for an interval get the shared heartbeat frame, and
+    clients silent past WS_TIMEOUT are handed to on_timeout.
+    """
+    
+    def __init__(self, on_timeout: Callable[[ClientConnection], None]):
+        self.on_timeout = on_timeout
+        self.tick_interval = Config.WS_HEARTBEAT_TICK
+        slot_count = max(1, math.ceil(Config.WS_HEARTBEAT_INTERVAL / self.tick_interval))
+        self.slots: List[Set[ClientConnection]] = [set() for _ in range(slot_count)]
+        self.slot_of: Dict[str, int] = {}
+        self.position = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    def __len__(self) -> int:
+        return len(self.slot_of)
+    
+    def add(self, connection: ClientConnection):
+        """Schedule a connection's first check one full interval from now"""
+        self.slot_of[connection.connection_id] = self.position
+        self.slots[self.position].add(connection)
+    
+    def discard(self, connection: ClientConnection):
+        """Stop tracking a connection"""
+        slot = self.slot_of.pop(connection.connection_id, None)
+        if slot is not None:
+            self.slots[slot].discard(connection)
+    
+    def tick(self):
+        """Advance one slot, sending heartbeats and reaping idle connections"""
+        self.position = (self.position + 1) % len(self.slots)
+        now = time.monotonic()
+        for connection in list(self.slots[self.position]):
+            idle = now - connection.last_seen
+            if idle > Config.WS_TIMEOUT:
+                self.on_timeout(connection)
+            elif idle >= Config.WS_HEARTBEAT_INTERVAL:
+                connection.send_frame(HEARTBEAT_FRAME)
+    
+    def start(self):
+        """Start ticking"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop ticking"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Heartbeat tick failed", error=str(e))
+
 
 class WebSocketManager:
     """Manages WebSocket connections and message broadcasting"""
     
     def __init__(self, redis_client: redis.Redis):
         self.redis = redis_client
-        self.connections: Dict[str, WebSocket] = {}
+        self.connections: Dict[str, ClientConnection] = {}
+        self.connections_by_ip: Dict[str, Set[str]] = {}
+        # Broadcast targets: subscribers of one channel, plus everyone subscribed to all
+        self.connections_by_channel: Dict[str, Set[str]] = {}
+        self.all_channel_connections: Set[str] = set()
+        self.totals = TrafficTotals()
+        self.message_buffer = RecentMessageBuffer()
+        self.channel_buffers: Dict[str, RecentMessageBuffer] = {}
+        self.authors = AuthorTable()
+        # Highest seq in the preloaded history; the stream consumer replays
+        # entries up to it after a restart, and those are already buffered
+        self.preloaded_seq = 0
+        self.rate_limiter = TokenBucketRateLimiter(redis_client)
+        self.heartbeats = HeartbeatWheel(self._handle_timeout)
+        self.load = LoadMonitor(lambda: (connection.queue.qsize() for connection in self.connections.values()))
+        # Messages waiting for the current coalescing window to close
+        self._pending: List[Frame] = []
+        self._coalesce_task: Optional[asyncio.Task] = None
     
-    async def connect(self, websocket: WebSocket) -> str:
+    async def start(self):
+        """Warm the recent message buffer and start background tasks"""
+        await self.preload_recent_messages()
+        self.rate_limiter.start()
+        self.heartbeats.start()
+        self.load.start()
+    
+    async def close(self):
+        """Stop background tasks, delivering any coalesced messages first"""
+        if self._coalesce_task:
+            self._coalesce_task.cancel()
+            try:
+                await self._coalesce_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_pending()
+        await self.heartbeats.stop()
+        await self.load.stop()
+        await self.rate_limiter.stop()
+    
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
         """Accept a new WebSocket connection"""
         client_ip = websocket.client.host
         connection_id = str(uuid.uuid4())
@@ -29,109 +298,393 @@ class WebSocketManager:
             await websocket.close(code=1013, reason="Server overloaded")
             raise ValueError("Server overloaded")
         
-        ip_connections = await self._get_connection_count_for_ip(client_ip)
+        ip_connections = self._get_connection_count_for_ip(client_ip)
         if ip_connections >= Config.MAX_CONNECTIONS_PER_IP:
             await websocket.close(code=1013, reason="Too many connections from IP")
             raise ValueError("Too many connections from IP")
         
+        overload_reason = self.load.overload_reason()
+        if overload_reason:
+            # Accept first so the client sees the 1013 close code and the retry hint
+            retry_after = self.load.retry_after()
+            await websocket.accept()
+            await websocket.close(code=1013, reason=f"Server overloaded, retry after {retry_after}s")
+            logger.warning("WebSocket connection refused", 
+                          client_ip=client_ip,
+                          reason=overload_reason,
+                          retry_after=retry_after)
+            raise ValueError("Server overloaded")
+        
         await websocket.accept()
-        self.connections[connection_id] = websocket
+        encoding = negotiate_encoding(websocket.query_params.get("encoding"),
+                                      websocket.query_params.get("compress"))
+        connection = ClientConnection(connection_id, websocket, encoding,
+                                      self._handle_slow_consumer, self.totals)
+        channels = websocket.query_params.get("channels")
+        if channels:
+            connection.channels = self._configured_channels(channels.split(","))
+        if websocket.query_params.get("authors") == "ref":
+            connection.known_authors = {}
+        connection.accepts_arrays = websocket.query_params.get("coalesce", "").lower() in ("1", "true", "yes")
+        self._add_connection(connection)
+        CONNECTIONS_OPENED.inc()
         
         logger.info("WebSocket connection established", 
                    connection_id=connection_id,
                    client_ip=client_ip,
+                   encoding=encoding,
                    total_connections=len(self.connections))
         
-        return connection_id
+        return connection
     
     async def disconnect(self, connection_id: str):
         """Remove a WebSocket connection"""
-        if connection_id in self.connections:
-            del self.connections[connection_id]
+        connection = self._remove_connection(connection_id)
+        if connection:
+            connection.stop()
             logger.info("WebSocket connection removed", 
                        connection_id=connection_id,
                        remaining_connections=len(self.connections))
     
-    async def broadcast_message(self, message_data: dict):
-        """Broadcast message to all connected WebSocket clients"""
+    async def broadcast_message(self, message: Union[Frame, dict]):
+        """Queue a message for every client subscribed to its channel
+        
+        The message is serialized once per negotiated encoding and the same
+        payload is shared by every connection. Edit and delete deltas patch
+        the buffered history instead of being appended to it.
+        
+        With WS_COALESCE_WINDOW set, a message arriving in a quiet period is
+        sent at once and opens a window; messages arriving while it is open
+        are delivered together when it closes, or as soon as
+        WS_COALESCE_MAX_BATCH of them are waiting.
+        """
+        frame = message if isinstance(message, Frame) else Frame.from_data(message)
+        if Config.WS_COALESCE_WINDOW <= 0:
+            self._deliver([frame])
+            return
+        
+        self._pending.append(frame)
+        if self._coalesce_task is None:
+            self._flush_pending()
+            self._coalesce_task = asyncio.create_task(self._coalesce())
+        elif len(self._pending) >= Config.WS_COALESCE_MAX_BATCH:
+            self._flush_pending()
+    
+    def _record(self, frame: Frame) -> Optional[Frame]:
+        """Update the history buffers and author table, returning the author's profile frame"""
+        channel_id = frame.data.get("channel_id")
+        author_frame = self.authors.frame_for(frame.data) if "author_id" in frame.data else None
+        if "op" in frame.data:
+            self.message_buffer.apply(frame.data)
+            if channel_id in self.channel_buffers:
+                self.channel_buffers[channel_id].apply(frame.data)
+        else:
+            self.message_buffer.append(frame)
+            if channel_id is not None:
+                self._channel_buffer(channel_id).append(frame)
+        return author_frame
+    
+    async def _coalesce(self):
+        """Flush what arrived during each window, closing after a quiet one"""
+        try:
+            while True:
+                await asyncio.sleep(Config.WS_COALESCE_WINDOW)
+                if not self._pending:
+                    break
+                self._flush_pending()
+        finally:
+            self._coalesce_task = None
+    
+    def _flush_pending(self):
+        """Deliver the messages gathered in the current window"""
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self._deliver(batch)
+    
+    def _deliver(self, frames: List[Frame]):
+        """Record a batch of messages and queue it for subscribers, one send per client"""
+        if self.preloaded_seq:
+            frames = [frame for frame in frames if frame.data.get("seq", math.inf) > self.preloaded_seq]
+            if not frames:
+                return
+            # Past the preloaded history, so the stream replay is over
+            self.preloaded_seq = 0
+        
+        started = time.perf_counter()
+        # Recorded on delivery so history sent to a new client never overlaps what is still pending
+        batch = [(frame, self._record(frame), self._created_at(frame)) for frame in frames]
         if not self.connections:
             return
         
-        dead_connections = []
-        successful_sends = 0
+        # Which batch entries each connection receives
+        if len(batch) == 1:
+            channel_id = batch[0][0].data.get("channel_id")
+            deliveries = dict.fromkeys(self.all_channel_connections, [0])
+            deliveries.update(dict.fromkeys(self.connections_by_channel.get(channel_id, ()), [0]))
+        else:
+            deliveries: Dict[str, List[int]] = {}
+            for index, (frame, _, _) in enumerate(batch):
+                channel_id = frame.data.get("channel_id")
+                for connection_id in self.all_channel_connections:
+                    deliveries.setdefault(connection_id, []).append(index)
+                for connection_id in self.connections_by_channel.get(channel_id, ()):
+                    deliveries.setdefault(connection_id, []).append(index)
         
-        for connection_id, ws in self.connections.items():
-            try:
-                # Check rate limiting
-                if not await self._check_rate_limit(ws.client.host):
-                    continue
-                
-                await ws.send_text(json.dumps(message_data))
-                successful_sends += 1
-                
-            except Exception as e:
-                logger.warning("Failed to send message to client", 
-                             connection_id=connection_id,
-                             error=str(e))
-                dead_connections.append(connection_id)
+        # Clients with the same subscriptions share each array frame
+        arrays: Dict[Tuple[bool, Tuple[int, ...]], Frame] = {}
+        slow_connections: List[ClientConnection] = []
+        queued = 0
+        
+        for connection_id, indexes in deliveries.items():
+            connection = self.connections.get(connection_id)
+            if connection is None:
+                continue
+            
+            # Check rate limiting
+            if not self.rate_limiter.allow(connection.client_ip):
+                continue
+            
+            if self._send_batch(connection, batch, indexes, arrays):
+                queued += 1
+            else:
+                slow_connections.append(connection)
+        
+        for connection in slow_connections:
+            self._handle_slow_consumer(connection, "queue_full")
+        duration = time.perf_counter() - started
+        self.load.record_broadcast(duration)
+        BROADCAST_DURATION.observe(duration)
+        
+        logger.info("Message broadcast queued", 
+                   messages=len(batch),
+                   queued=queued,
+                   slow_connections=len(slow_connections))
+    
+    @staticmethod
+    def _created_at(frame: Frame) -> Optional[float]:
+        """Discord creation time of a live message; None for deltas and other frames"""
+        if "op" in frame.data or "id" not in frame.data:
+            return None
+        return snowflake_time(int(frame.data["id"]))
+    
+    @staticmethod
+    def _send_batch(connection: ClientConnection, batch: List[Tuple[Frame, Optional[Frame], Optional[float]]],
+                    indexes: List[int], arrays: Dict[Tuple[bool, Tuple[int, ...]], Frame]) -> bool:
+        """Queue a connection's share of a batch, as one array frame if it accepts them
+        
+        Interning clients get messages by author reference, preceded by any
+        profile they do not hold yet.
+        """
+        if connection.replayed_seq:
+            indexes = [index for index in indexes
+                       if batch[index][0].data.get("seq", math.inf) > connection.replayed_seq]
+            if not indexes:
+                return True
+            connection.replayed_seq = 0
+        
+        interned = connection.known_authors is not None
+        frames: List[Frame] = []
+        created: List[Optional[float]] = []
+        for index in indexes:
+            frame, author_frame, created_at = batch[index]
+            if interned and author_frame is not None:
+                author_id = author_frame.data["id"]
+                if connection.known_authors.get(author_id) is not author_frame:
+                    if not connection.send_frame(author_frame):
+                        return False
+                    connection.known_authors[author_id] = author_frame
+                frame = compact_frame(frame)
+            frames.append(frame)
+            created.append(created_at)
+        
+        if len(frames) == 1 or not connection.accepts_arrays:
+            return all(connection.send_frame(frame, created_at) for frame, created_at in zip(frames, created))
+        
+        key = (interned, tuple(indexes))
+        array = arrays.get(key)
+        if array is None:
+            array = arrays[key] = array_frame(frames)
+        live = [created_at for created_at in created if created_at is not None]
+        return connection.send_frame(array, min(live) if live else None)
+    
+    def _handle_slow_consumer(self, connection: ClientConnection, reason: str):
+        """Resync or evict a client whose outbound queue is not draining"""
+        if connection.is_closed:
+            return
+        SEND_FAILURES.labels(reason).inc()
         
-        # Remove dead connections
-        for connection_id in dead_connections:
-            await self.disconnect(connection_id)
+        logger.warning("Slow WebSocket consumer", 
+                     connection_id=connection.connection_id,
+                     reason=reason,
+                     queued=connection.queue.qsize(),
+                     lag=round(connection.lag, 3),
+                     policy=Config.WS_SLOW_CONSUMER_POLICY)
         
-        logger.info("Message broadcast completed", 
-                   successful_sends=successful_sends,
-                   dead_connections=len(dead_connections))
+        # A client still holding the last resync is not draining at all
+        if Config.WS_SLOW_CONSUMER_POLICY == "resync" and not connection.resync_pending:
+            connection.resync()
+        else:
+            connection.close(code=1013, reason="Slow consumer")
+            self._remove_connection(connection.connection_id)
     
-    async def send_recent_messages(self, websocket: WebSocket):
-        """Send recent messages to a new connection"""
+    async def preload_recent_messages(self):
+        """Fill the recent message buffers from Redis, falling back to Postgres"""
+        channel_ids = [None] + sorted(Config.DISCORD_CHANNEL_IDS)
         try:
-            recent_messages = await self.redis.lrange("recent_messages", 0, -1)
-            for message_json in reversed(recent_messages):
+            with REDIS_LATENCY.labels("preload").time():
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for channel_id in channel_ids:
+                        pipe.lrange(recent_messages_key(channel_id), 0, Config.MESSAGE_HISTORY_LIMIT - 1)
+                    histories = await pipe.execute()
+        except Exception as e:
+            logger.warning("Failed to preload recent messages from Redis", error=str(e))
+            histories = [[] for _ in channel_ids]
+        
+        for channel_id, recent_messages in zip(channel_ids, histories):
+            source = "redis"
+            # Redis already holds the JSON payload; reuse it as-is
+            frames = [Frame.from_json(message_json) for message_json in reversed(recent_messages)]
+            if not frames:
+                source = "database"
                 try:
-                    message_data = json.loads(message_json)
-                    await websocket.send_text(json.dumps(message_data))
+                    messages = await db_manager.get_messages(Config.MESSAGE_HISTORY_LIMIT, channel_id=channel_id)
+                    frames = [Frame.from_data(message) for message in reversed(messages)]
                 except Exception as e:
-                    logger.warning("Failed to send recent message", error=str(e))
+                    logger.error("Failed to preload recent messages from database",
+                                channel_id=channel_id,
+                                error=str(e))
+            
+            buffer = self.message_buffer if channel_id is None else self._channel_buffer(str(channel_id))
+            buffer.extend(frames)
+            for frame in frames:
+                if "author_id" in frame.data:
+                    self.authors.frame_for(frame.data)
+                self.preloaded_seq = max(self.preloaded_seq, frame.data.get("seq", 0))
+            logger.info("Recent message buffer preloaded",
+                       channel_id=channel_id,
+                       source=source,
+                       messages=len(frames))
+    
+    def merge_history(self, frames: List[Frame]):
+        """Merge older messages into the recent message buffers without delivering them"""
+        self.message_buffer.merge(frames)
+        by_channel: Dict[str, List[Frame]] = {}
+        for frame in frames:
+            channel_id = frame.data.get("channel_id")
+            if channel_id is not None:
+                by_channel.setdefault(channel_id, []).append(frame)
+        for channel_id, channel_frames in by_channel.items():
+            self._channel_buffer(channel_id).merge(channel_frames)
+        logger.info("Recent message buffers merged", messages=len(frames))
+    
+    def _channel_buffer(self, channel_id: str) -> RecentMessageBuffer:
+        """Get or create the recent message buffer of a channel"""
+        buffer = self.channel_buffers.get(channel_id)
+        if buffer is None:
+            buffer = self.channel_buffers[channel_id] = RecentMessageBuffer()
+        return buffer
+    
+    def _recent_frames(self, channels: Optional[Iterable[str]]) -> Iterable[Frame]:
+        """Recent frames oldest first, across all channels or the given ones"""
+        if channels is None:
+            return self.message_buffer
+        buffers = [self.channel_buffers[channel_id] for channel_id in channels if channel_id in self.channel_buffers]
+        if len(buffers) == 1:
+            return buffers[0]
+        # Snowflake IDs are time-ordered, so merging by ID interleaves channels chronologically
+        merged = list(heapq.merge(*buffers, key=lambda frame: int(frame.data["id"])))
+        return merged[-Config.MESSAGE_HISTORY_LIMIT:]
+    
+    def _history_frame(self, connection: ClientConnection, frames: Iterable[Frame]) -> Optional[Frame]:
+        """One batch frame of history, with a single author dictionary for interning clients"""
+        if connection.known_authors is not None:
+            return self.authors.history_batch(frames, connection.known_authors)
+        payloads = [frame.json for frame in frames]
+        return batch_frame(payloads) if payloads else None
+    
+    async def send_recent_messages(self, connection: ClientConnection):
+        """Queue recent messages for a new connection from the in-process buffers"""
+        frames = self._recent_frames(connection.channels)
+        if connection.known_authors is not None:
+            batch = self._history_frame(connection, frames)
+            if batch is not None:
+                connection.send_frame(batch)
+            return
+        
+        for frame in frames:
+            if not connection.send_frame(frame):
+                break
+    
+    async def send_missed_messages(self, connection: ClientConnection, since: int):
+        """Queue the frames a reconnecting client missed as a single batch
+        
+        Falls back to a resync signal followed by the recent history when
+        the gap is no longer covered by the replay log. Live delivery is
+        held until the log is read, so nothing newer is queued ahead of the
+        gap, and live frames the replay already covers are dropped.
+        """
+        self._unindex_subscriptions(connection)
+        try:
+            with REDIS_LATENCY.labels("replay").time():
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get("message_seq")
+                    pipe.zrange("message_log", 0, 0, withscores=True)
+                    pipe.zrangebyscore("message_log", f"({since}", "+inf")
+                    current_seq, oldest, missed = await pipe.execute()
         except Exception as e:
-            logger.error("Failed to send recent messages", error=str(e))
+            logger.error("Failed to read replay log", error=str(e))
+            missed, oldest, current_seq = None, None, None
+        finally:
+            if connection.connection_id in self.connections:
+                self._index_subscriptions(connection)
+        
+        current_seq = int(current_seq or 0)
+        gap_covered = (
+            missed is not None
+            and since <= current_seq
+            and (since == current_seq or (oldest and int(oldest[0][1]) <= since + 1))
+        )
+        if not gap_covered:
+            logger.info("Replay gap too large, sending full resync", 
+                       connection_id=connection.connection_id,
+                       since=since,
+                       current_seq=current_seq)
+            connection.send_frame(RESYNC_FRAME)
+            await self.send_recent_messages(connection)
+            return
+        
+        connection.replayed_seq = current_seq
+        if missed and connection.channels is not None:
+            missed = [payload for payload in missed if loads(payload).get("channel_id") in connection.channels]
+        if missed:
+            connection.send_frame(self._history_frame(connection, [Frame.from_json(payload) for payload in missed]))
     
     async def handle_connection(self, websocket: WebSocket):
         """Handle a WebSocket connection lifecycle"""
         connection_id = None
         try:
-            connection_id = await self.connect(websocket)
-            
-            # Send recent messages
-            await self.send_recent_messages(websocket)
+            connection = await self.connect(websocket)
+            connection_id = connection.connection_id
             
-            # Keep connection alive with heartbeat
-            last_heartbeat = time.time()
+            # Replay only the gap for resuming clients, recent messages otherwise
+            since = websocket.query_params.get("since")
+            if since is not None and since.isdigit():
+                await self.send_missed_messages(connection, int(since))
+            else:
+                await self.send_recent_messages(connection)
+            connection.start()
             
-            while True:
-                try:
-                    # Wait for message with timeout
-                    message = await asyncio.wait_for(
-                        websocket.receive_text(), 
-                        timeout=Config.WS_HEARTBEAT_INTERVAL
-                    )
-                    
-                    # Handle ping/pong for heartbeat
-                    if message == "ping":
-                        await websocket.send_text("pong")
-                        last_heartbeat = time.time()
-                    
-                except asyncio.TimeoutError:
-                    # Send heartbeat if no message received
-                    current_time = time.time()
-                    if current_time - last_heartbeat > Config.WS_TIMEOUT:
-                        logger.info("WebSocket timeout", connection_id=connection_id)
-                        break
-                    
-                    try:
-                        await websocket.send_text(json.dumps({"type": "heartbeat"}))
-                    except:
-                        break
+            # Heartbeats and idle timeouts are driven by the heartbeat wheel;
+            # this task only waits for what the client sends
+            while not connection.is_closed:
+                message = await websocket.receive_text()
+                connection.last_seen = time.monotonic()
+                
+                # Handle ping/pong for heartbeat
+                if message == "ping":
+                    connection.enqueue("pong")
+                elif message.startswith("{"):
+                    self._handle_client_op(connection, message)
                         
         except WebSocketDisconnect:
             logger.info("WebSocket disconnected", connection_id=connection_id)
@@ -143,41 +696,121 @@ class WebSocketManager:
             if connection_id:
                 await self.disconnect(connection_id)
     
-    async def _check_rate_limit(self, client_ip: str) -> bool:
-        """Check if client is within rate limits"""
+    def _handle_timeout(self, connection: ClientConnection):
+        """Close a connection that has been silent past WS_TIMEOUT"""
+        logger.info("WebSocket timeout", connection_id=connection.connection_id)
+        connection.close(code=1001, reason="Heartbeat timeout")
+        self._remove_connection(connection.connection_id)
+    
+    def _handle_client_op(self, connection: ClientConnection, message: str):
+        """Apply a {"op": "subscribe" | "unsubscribe", "channels": [...]} request"""
         try:
-            key = f"rate_limit:{client_ip}"
-            current = await self.redis.get(key)
-            
-            if current is None:
-                await self.redis.setex(key, Config.RATE_LIMIT_WINDOW, 1)
-                return True
-            
-            if int(current) >= Config.RATE_LIMIT_MAX_REQUESTS:
-                return False
-            
-            await self.redis.incr(key)
-            return True
-            
-        except Exception as e:
-            logger.error("Rate limit check failed", client_ip=client_ip, error=str(e))
-            return True  # Allow on error
+            request = loads(message)
+            op = request.get("op")
+            channels = self._configured_channels(request.get("channels") or [])
+        except (ValueError, TypeError, AttributeError):
+            logger.warning("Invalid client message", connection_id=connection.connection_id)
+            return
+        
+        if op == "subscribe":
+            # An all-channel connection already has every channel's history
+            added = channels - connection.channels if connection.channels is not None else set()
+            self.subscribe(connection, channels)
+            batch = self._history_frame(connection, self._recent_frames(added)) if added else None
+            if batch is not None:
+                # Give newly added channels their history, like a fresh connection
+                connection.send_frame(batch)
+        elif op == "unsubscribe":
+            self.unsubscribe(connection, channels)
+        else:
+            return
+        
+        connection.send_frame(Frame.from_data({
+            "type": "subscriptions",
+            "channels": sorted(connection.channels) if connection.channels is not None else None,
+        }))
     
-    async def _get_connection_count_for_ip(self, client_ip: str) -> int:
+    def subscribe(self, connection: ClientConnection, channels: Set[str]):
+        """Narrow an all-channel connection to, or extend it with, the given channels"""
+        self._unindex_subscriptions(connection)
+        connection.channels = (connection.channels or set()) | channels
+        self._index_subscriptions(connection)
+    
+    def unsubscribe(self, connection: ClientConnection, channels: Set[str]):
+        """Stop delivering the given channels to a connection"""
+        self._unindex_subscriptions(connection)
+        current = connection.channels
+        if current is None:
+            current = {str(channel_id) for channel_id in Config.DISCORD_CHANNEL_IDS}
+        connection.channels = current - channels
+        self._index_subscriptions(connection)
+    
+    @staticmethod
+    def _configured_channels(channel_ids: Iterable) -> Set[str]:
+        """Keep the channel IDs this deployment ingests, as strings"""
+        channels = {str(channel_id).strip() for channel_id in channel_ids}
+        return {channel_id for channel_id in channels
+                if channel_id.isdigit() and int(channel_id) in Config.DISCORD_CHANNEL_IDS}
+    
+    def _index_subscriptions(self, connection: ClientConnection):
+        if connection.channels is None:
+            self.all_channel_connections.add(connection.connection_id)
+            return
+        for channel_id in connection.channels:
+            self.connections_by_channel.setdefault(channel_id, set()).add(connection.connection_id)
+    
+    def _unindex_subscriptions(self, connection: ClientConnection):
+        if connection.channels is None:
+            self.all_channel_connections.discard(connection.connection_id)
+            return
+        for channel_id in connection.channels:
+            subscribers = self.connections_by_channel.get(channel_id)
+            if subscribers is not None:
+                subscribers.discard(connection.connection_id)
+                if not subscribers:
+                    del self.connections_by_channel[channel_id]
+    
+    def _add_connection(self, connection: ClientConnection):
+        """Register a connection in the indexes and the heartbeat wheel"""
+        self.connections[connection.connection_id] = connection
+        self.connections_by_ip.setdefault(connection.client_ip, set()).add(connection.connection_id)
+        self._index_subscriptions(connection)
+        self.heartbeats.add(connection)
+        WEBSOCKET_CONNECTIONS.set(len(self.connections))
+    
+    def _remove_connection(self, connection_id: str) -> Optional[ClientConnection]:
+        """Drop a connection from the indexes and the heartbeat wheel"""
+        connection = self.connections.pop(connection_id, None)
+        if connection:
+            CONNECTIONS_CLOSED.inc()
+            WEBSOCKET_CONNECTIONS.set(len(self.connections))
+            self._unindex_subscriptions(connection)
+            self.heartbeats.discard(connection)
+            ip_connections = self.connections_by_ip.get(connection.client_ip)
+            if ip_connections is not None:
+                ip_connections.discard(connection_id)
+                if not ip_connections:
+                    del self.connections_by_ip[connection.client_ip]
+        return connection
+    
+    def _get_connection_count_for_ip(self, client_ip: str) -> int:
         """Get current connection count for an IP"""
-        count = 0
-        for ws in self.connections.values():
-            if ws.client.host == client_ip:
-                count += 1
-        return count
+        return len(self.connections_by_ip.get(client_ip, ()))
     
     def get_connection_stats(self) -> Dict[str, int]:
         """Get connection statistics"""
-        connections_by_ip = {}
-        for ws in self.connections.values():
-            ip = ws.client.host
-            connections_by_ip[ip] = connections_by_ip.get(ip, 0) + 1
-        return connections_by_ip
+        return {ip: len(ids) for ip, ids in self.connections_by_ip.items()}
+    
+    def get_connection_details(self) -> List[dict]:
+        """Get per-connection delivery metrics"""
+        return [connection.get_info() for connection in self.connections.values()]
+    
+    def get_traffic_totals(self) -> Dict[str, int]:
+        """Get bytes and messages sent across all connections"""
+        return {
+            "bytes_sent": self.totals.bytes_sent,
+            "messages_sent": self.totals.messages_sent,
+        }
     
     def get_total_connections(self) -> int:
         """Get total number of connections"""
@@ -185,4 +818,4 @@ class WebSocketManager:
     
     def is_connected(self) -> bool:
         """Check if the WebSocket manager is properly initialized"""
-        return self.redis is not None 
\ No newline at end of file
+        return self.redis is not None
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Payload benchmark: inline author profiles vs interned author references.
+
+Replays synthetic channel traffic through the same frame building a
+WebSocket connection gets with and without ?authors=ref, and reports the
+JSON bytes per live message and for the connect-time history batch. Author
+activity is skewed so a few regulars post most messages, like a busy
+channel. No database or Redis is needed.
+
+    uv run python benchmarks/bench_author_interning.py --messages 10000 --authors 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.authors import AuthorTable, compact_frame
+from app.config import Config
+from app.encoding import Frame
+
+
+def generate_messages(count: int, author_count: int) -> list:
+    """Synthetic message frames with Zipf-like author activity"""
+    authors = []
+    for _ in range(author_count):
+        author_id = str(random.getrandbits(62))
+        authors.append({
+            "author": f"user-{author_id[-4:]}",
+            "author_id": author_id,
+            "avatar": f"https://cdn.discordapp.com/avatars/{author_id}/{uuid.uuid4().hex}.png",
+        })
+    weights = [1 / rank for rank in range(1, author_count + 1)]
+    channel_id = str(random.getrandbits(62))
+    started = datetime.now(timezone.utc) - timedelta(hours=1)
+    
+    frames = []
+    for seq, author in enumerate(random.choices(authors, weights, k=count), start=1):
+        frames.append(Frame.from_data({
+            "seq": seq,
+            "id": str(random.getrandbits(62)),
+            "channel_id": channel_id,
+            **author,
+            "content": "benchmark message " * random.randint(1, 8),
+            "timestamp": (started + timedelta(milliseconds=seq * 250)).isoformat(),
+        }))
+    return frames
+
+
+def live_bytes(frames: list, interned: bool) -> int:
+    """Bytes one connection receives for the live messages"""
+    if not interned:
+        return sum(len(frame.json) for frame in frames)
+    
+    table = AuthorTable()
+    known_authors = {}
+    total = 0
+    for frame in frames:
+        author_frame = table.frame_for(frame.data)
+        if known_authors.get(author_frame.data["id"]) is not author_frame:
+            total += len(author_frame.json)
+            known_authors[author_frame.data["id"]] = author_frame
+        total += len(compact_frame(frame).json)
+    return total
+
+
+def history_bytes(frames: list, interned: bool) -> int:
+    """Bytes of the connect-time history"""
+    if not interned:
+        return sum(len(frame.json) for frame in frames)
+    
+    table = AuthorTable()
+    for frame in frames:
+        table.frame_for(frame.data)
+    return len(table.history_batch(frames, {}).json)
+
+
+def main(message_count: int, author_count: int, history: int):
+    frames = generate_messages(message_count, author_count)
+    history_frames = frames[-history:]
+    
+    print(f"{message_count} messages from {author_count} authors, history of {len(history_frames)}")
+    print(f"{'mode':<10}{'live B/msg':>12}{'live KB':>10}{'history KB':>12}")
+    results = {}
+    for mode, interned in (("inline", False), ("interned", True)):
+        live = live_bytes(frames, interned)
+        batch = history_bytes(history_frames, interned)
+        results[mode] = (live, batch)
+        print(f"{mode:<10}{live / message_count:>12.1f}{live / 1024:>10.1f}{batch / 1024:>12.1f}")
+    
+    inline, interned = results["inline"], results["interned"]
+    print(f"saved     {1 - interned[0] / inline[0]:>12.1%}{'':>10}{1 - interned[1] / inline[1]:>12.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--authors", type=int, default=200)
+    parser.add_argument("--history", type=int, default=Config.MESSAGE_HISTORY_LIMIT)
+    args = parser.parse_args()
+    main(args.messages, args.authors, args.history)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Compression benchmark: CPU time vs bytes saved per deflate level.
+
+Compresses synthetic message frames and a connect-time history burst at
+every zlib level, the way frames are compressed for ?compress=deflate
+clients, and reports the compressed size and the CPU time per frame. The
+last column is the CPU a broadcast would spend if every one of --clients
+connections compressed the frame itself, as per-connection
+permessage-deflate does; shared frames pay the per-frame cost once.
+No database or Redis is needed.
+
+    uv run python benchmarks/bench_frame_compression.py --messages 2000 --clients 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.encoding import Frame, batch_frame, deflate
+
+
+def generate_frames(count: int, author_count: int = 50) -> list:
+    """Synthetic message frames, as broadcast to clients"""
+    authors = []
+    for _ in range(author_count):
+        author_id = str(random.getrandbits(62))
+        authors.append({
+            "author": f"user-{author_id[-4:]}",
+            "author_id": author_id,
+            "avatar": f"https://cdn.discordapp.com/avatars/{author_id}/{uuid.uuid4().hex}.png",
+        })
+    channel_id = str(random.getrandbits(62))
+    started = datetime.now(timezone.utc) - timedelta(hours=1)
+    
+    frames = []
+    for seq in range(1, count + 1):
+        frames.append(Frame.from_data({
+            "seq": seq,
+            "id": str(random.getrandbits(62)),
+            "channel_id": channel_id,
+            **random.choice(authors),
+            "content": "benchmark message " * random.randint(1, 8),
+            "timestamp": (started + timedelta(milliseconds=seq * 250)).isoformat(),
+        }))
+    return frames
+
+
+def measure(payloads: list, level: int) -> tuple:
+    """Total compressed bytes and CPU seconds per payload at a level"""
+    started = time.process_time()
+    compressed = sum(len(deflate(payload, level)) for payload in payloads)
+    return compressed, (time.process_time() - started) / len(payloads)
+
+
+def main(message_count: int, clients: int, history: int):
+    frames = generate_frames(message_count)
+    live = [frame.json for frame in frames]
+    bursts = [batch_frame(live[offset:offset + history]).json for offset in range(0, len(live) - history + 1, history)]
+    live_bytes = sum(len(payload) for payload in live)
+    burst_bytes = sum(len(payload) for payload in bursts)
+    
+    print(f"{message_count} frames averaging {live_bytes / len(live):.0f} B, "
+          f"history bursts of {history} averaging {burst_bytes / len(bursts) / 1024:.1f} KB")
+    print(f"{'level':<7}{'frame %':>9}{'us/frame':>10}{'burst %':>9}{'us/burst':>10}"
+          f"{f'ms/{clients} clients':>20}")
+    for level in range(1, 10):
+        frame_size, frame_cpu = measure(live, level)
+        burst_size, burst_cpu = measure(bursts, level)
+        print(f"{level:<7}{frame_size / live_bytes:>9.1%}{frame_cpu * 1e6:>10.1f}"
+              f"{burst_size / burst_bytes:>9.1%}{burst_cpu * 1e6:>10.1f}"
+              f"{frame_cpu * clients * 1e3:>20.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=Config.MESSAGE_HISTORY_LIMIT)
+    args = parser.parse_args()
+    main(args.messages, args.clients, args.history)
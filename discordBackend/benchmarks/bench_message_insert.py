@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Insert benchmark: legacy UUID/VARCHAR message layout vs the compact layout.
+
+Creates two scratch tables in DATABASE_URL, inserts the same synthetic
+messages into each using the ingest writer's batched multi-row insert, and
+reports throughput plus on-disk table and index sizes. The scratch tables
+are dropped afterwards.
+
+    uv run python benchmarks/bench_message_insert.py --rows 200000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.database import get_async_database_url
+from sqlalchemy import (BigInteger, Column, DateTime, Index, MetaData, String,
+                        Table, Text, text)
+from sqlalchemy.dialects.postgresql import UUID, insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+DISCORD_EPOCH_MS = 1420070400000
+
+metadata = MetaData()
+
+legacy_table = Table(
+    "bench_messages_legacy", metadata,
+    Column("id", UUID(as_uuid=True), primary_key=True),
+    Column("discord_message_id", String, unique=True, nullable=False),
+    Column("author_name", String, nullable=False),
+    Column("author_id", String, nullable=False),
+    Column("avatar_url", String),
+    Column("content", Text, nullable=False),
+    Column("channel_id", String, nullable=False),
+    Column("guild_id", String, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("processed_at", DateTime),
+)
+
+compact_table = Table(
+    "bench_messages_compact", metadata,
+    Column("id", BigInteger, primary_key=True, autoincrement=False),
+    Column("channel_id", BigInteger, nullable=False),
+    Column("guild_id", BigInteger, nullable=False),
+    Column("author_id", BigInteger, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("processed_at", DateTime),
+    Column("author_name", String, nullable=False),
+    Column("avatar_url", String),
+    Column("content", Text, nullable=False),
+    Index("ix_bench_compact_channel_created", "channel_id", "created_at"),
+    Index("ix_bench_compact_author_created", "author_id", "created_at"),
+)
+
+
+def generate_messages(count: int) -> list:
+    """Synthetic messages with increasing snowflakes, like a live channel"""
+    started = datetime.utcnow() - timedelta(days=1)
+    authors = [random.getrandbits(62) for _ in range(50)]
+    guild_id = random.getrandbits(62)
+    channels = [random.getrandbits(62) for _ in range(5)]
+    messages = []
+    for i in range(count):
+        created_at = started + timedelta(milliseconds=i * 50)
+        timestamp_ms = int((created_at - datetime(1970, 1, 1)).total_seconds() * 1000)
+        snowflake = ((timestamp_ms - DISCORD_EPOCH_MS) << 22) | (i & 0x3FFFFF)
+        author_id = random.choice(authors)
+        messages.append({
+            "id": snowflake,
+            "channel_id": random.choice(channels),
+            "guild_id": guild_id,
+            "author_id": author_id,
+            "created_at": created_at,
+            "processed_at": created_at,
+            "author_name": f"user-{author_id % 1000}",
+            "avatar_url": f"https://cdn.discordapp.com/avatars/{author_id}/{uuid.uuid4().hex}.png",
+            "content": "benchmark message " * random.randint(1, 8),
+        })
+    return messages
+
+
+def legacy_row(message: dict) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "discord_message_id": str(message["id"]),
+        "author_name": message["author_name"],
+        "author_id": str(message["author_id"]),
+        "avatar_url": message["avatar_url"],
+        "content": message["content"],
+        "channel_id": str(message["channel_id"]),
+        "guild_id": str(message["guild_id"]),
+        "created_at": message["created_at"],
+        "processed_at": message["processed_at"],
+    }
+
+
+async def run_layout(engine, table: Table, rows: list, batch_size: int, conflict_column: str) -> dict:
+    started = time.perf_counter()
+    async with engine.connect() as connection:
+        for offset in range(0, len(rows), batch_size):
+            statement = insert(table).values(rows[offset:offset + batch_size])
+            statement = statement.on_conflict_do_nothing(index_elements=[conflict_column])
+            await connection.execute(statement)
+            await connection.commit()
+    elapsed = time.perf_counter() - started
+    
+    async with engine.connect() as connection:
+        table_bytes = await connection.scalar(text(f"SELECT pg_table_size('{table.name}')"))
+        index_bytes = await connection.scalar(text(f"SELECT pg_indexes_size('{table.name}')"))
+    
+    return {
+        "layout": table.name,
+        "rows_per_s": len(rows) / elapsed,
+        "seconds": elapsed,
+        "table_mb": table_bytes / 1024 / 1024,
+        "index_mb": index_bytes / 1024 / 1024,
+    }
+
+
+async def main(row_count: int, batch_size: int):
+    engine = create_async_engine(get_async_database_url(Config.DATABASE_URL))
+    messages = generate_messages(row_count)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(metadata.drop_all)
+            await connection.run_sync(metadata.create_all)
+        
+        results = [
+            await run_layout(engine, legacy_table, [legacy_row(m) for m in messages], batch_size, "discord_message_id"),
+            await run_layout(engine, compact_table, messages, batch_size, "id"),
+        ]
+    finally:
+        async with engine.begin() as connection:
+            await connection.run_sync(metadata.drop_all)
+        await engine.dispose()
+    
+    print(f"{row_count} rows, batch size {batch_size}")
+    print(f"{'layout':<26}{'rows/s':>12}{'seconds':>10}{'table MB':>11}{'index MB':>11}")
+    for result in results:
+        print(f"{result['layout']:<26}{result['rows_per_s']:>12.0f}{result['seconds']:>10.2f}"
+              f"{result['table_mb']:>11.1f}{result['index_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=Config.INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.batch_size))
@@ -5,14 +5,40 @@ Discord Message Streamer - Main Entry Point
 A scalable Discord to WebSocket message streaming service.
 """
 
+import os
+import tempfile
+
 import uvicorn
 from app.config import Config
 
+
+def prepare_metrics_dir():
+    """Give worker processes a shared, empty Prometheus multiprocess directory
+    
+    Workers share one port, so a scrape reaches whichever worker answers;
+    in multiprocess mode that worker reports the metrics of all of them.
+    Must run before any worker imports prometheus_client.
+    """
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        if Config.WORKERS <= 1:
+            return
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    os.makedirs(path, exist_ok=True)
+    # Samples left by a previous run would be merged into this one's
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+
+
 if __name__ == "__main__":
+    prepare_metrics_dir()
     uvicorn.run(
         "app.application:fastapi_app",
         host=Config.HOST,
         port=Config.PORT,
         log_level=Config.LOG_LEVEL.lower(),
-        reload=Config.ENVIRONMENT == "development"
+        reload=Config.ENVIRONMENT == "development",
+        workers=Config.WORKERS,
+        ws_per_message_deflate=Config.WS_PER_MESSAGE_DEFLATE
     ) 
\ No newline at end of file
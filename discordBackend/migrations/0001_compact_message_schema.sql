@@ -0,0 +1,48 @@
+-- Migrate the messages table from the UUID/VARCHAR layout to the compact,
+-- time-ordered layout used by app/models.py:
+--   * Discord snowflakes (message, channel, guild, author IDs) become BIGINT
+--   * the message snowflake replaces the random UUID as the primary key
+--   * channel and author timelines get composite indexes
+--
+-- Run once, with the service stopped, before deploying the new schema:
+--   psql "$DATABASE_URL" -f migrations/0001_compact_message_schema.sql
+--
+-- The old table is kept as messages_legacy; drop it once verified.
+
+BEGIN;
+
+ALTER TABLE messages RENAME TO messages_legacy;
+ALTER TABLE messages_legacy RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey;
+ALTER TABLE messages_legacy RENAME CONSTRAINT messages_discord_message_id_key TO messages_legacy_discord_message_id_key;
+
+-- Fixed-width columns first to avoid alignment padding
+CREATE TABLE messages (
+    id           BIGINT    PRIMARY KEY,
+    channel_id   BIGINT    NOT NULL,
+    guild_id     BIGINT    NOT NULL,
+    author_id    BIGINT    NOT NULL,
+    created_at   TIMESTAMP NOT NULL,
+    processed_at TIMESTAMP,
+    author_name  VARCHAR   NOT NULL,
+    avatar_url   VARCHAR,
+    content      TEXT      NOT NULL
+);
+
+-- Insert in key order so the new primary key index is built append-only
+INSERT INTO messages (id, channel_id, guild_id, author_id, created_at, processed_at,
+                      author_name, avatar_url, content)
+SELECT discord_message_id::BIGINT, channel_id::BIGINT, guild_id::BIGINT, author_id::BIGINT,
+       created_at, processed_at, author_name, avatar_url, content
+FROM messages_legacy
+ORDER BY discord_message_id::BIGINT
+ON CONFLICT (id) DO NOTHING;
+
+CREATE INDEX ix_messages_channel_created ON messages (channel_id, created_at);
+CREATE INDEX ix_messages_author_created ON messages (author_id, created_at);
+
+COMMIT;
+
+ANALYZE messages;
+
+-- After verifying the row counts match:
+-- DROP TABLE messages_legacy;
@@ -0,0 +1,65 @@
+-- Convert the messages table into a table range-partitioned by created_at
+-- with daily partitions. The primary key becomes (id, created_at), since a
+-- partitioned table's unique constraints must include the partition key.
+-- Requires 0001_compact_message_schema.sql.
+--
+-- Run once, with the service stopped:
+--   psql "$DATABASE_URL" -f migrations/0002_partition_messages.sql
+--
+-- Afterwards the service creates upcoming partitions and retires ones past
+-- MESSAGE_TTL on its own (app/partitions.py). The old table is kept as
+-- messages_unpartitioned; drop it once verified.
+
+BEGIN;
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey;
+ALTER INDEX ix_messages_channel_created RENAME TO ix_messages_unpartitioned_channel_created;
+ALTER INDEX ix_messages_author_created RENAME TO ix_messages_unpartitioned_author_created;
+
+CREATE TABLE messages (
+    id           BIGINT    NOT NULL,
+    channel_id   BIGINT    NOT NULL,
+    guild_id     BIGINT    NOT NULL,
+    author_id    BIGINT    NOT NULL,
+    created_at   TIMESTAMP NOT NULL,
+    processed_at TIMESTAMP,
+    author_name  VARCHAR   NOT NULL,
+    avatar_url   VARCHAR,
+    content      TEXT      NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX ix_messages_channel_created ON messages (channel_id, created_at);
+CREATE INDEX ix_messages_author_created ON messages (author_id, created_at);
+
+-- One daily partition per day of existing data, through tomorrow
+DO $$
+DECLARE
+    day DATE;
+BEGIN
+    FOR day IN
+        SELECT generate_series(
+            COALESCE((SELECT min(created_at) FROM messages_unpartitioned)::DATE, current_date),
+            current_date + 1,
+            INTERVAL '1 day'
+        )::DATE
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+            'messages_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO messages
+SELECT id, channel_id, guild_id, author_id, created_at, processed_at, author_name, avatar_url, content
+FROM messages_unpartitioned
+ORDER BY id;
+
+COMMIT;
+
+ANALYZE messages;
+
+-- After verifying the row counts match:
+-- DROP TABLE messages_unpartitioned;
@@ -0,0 +1,21 @@
+-- Add the full-text search column and GIN index used by /messages/search.
+-- New rows get content_tsv at insert time; this backfills existing rows.
+-- Requires 0002_partition_messages.sql. The text search configuration
+-- must match SEARCH_LANGUAGE (default 'english').
+--
+--   psql "$DATABASE_URL" -f migrations/0003_message_search.sql
+
+BEGIN;
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR;
+
+UPDATE messages
+SET content_tsv = to_tsvector('english', content)
+WHERE content_tsv IS NULL;
+
+-- Created on the partitioned parent, so every partition gets its own index
+CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING gin (content_tsv);
+
+COMMIT;
+
+ANALYZE messages;
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+from app.config import Config
+from app.partitions import plan_partitions, uncovered_ranges
+
+
+def day(number: int) -> datetime:
+    return datetime(2026, 10, number)
+
+
+def daily(*numbers: int) -> list:
+    return [(f"messages_p202610{number:02d}", day(number), day(number + 1)) for number in numbers]
+
+
+@pytest.fixture
+def weekly(monkeypatch):
+    monkeypatch.setattr(Config, "MESSAGE_PARTITION_INTERVAL", "weekly")
+    monkeypatch.setattr(Config, "MESSAGE_TTL", 86400)
+    monkeypatch.setattr(Config, "MESSAGE_PARTITION_PREMAKE", 1)
+
+
+def test_uncovered_ranges_without_partitions():
+    assert uncovered_ranges(day(12), day(19), []) == [(day(12), day(19))]
+
+
+def test_uncovered_ranges_fills_around_existing_partitions():
+    existing = daily(13, 16)
+    assert uncovered_ranges(day(12), day(19), existing) == [
+        (day(12), day(13)),
+        (day(14), day(16)),
+        (day(17), day(19)),
+    ]
+
+
+def test_uncovered_ranges_fully_covered():
+    assert uncovered_ranges(day(13), day(15), daily(13, 14)) == []
+
+
+def test_switch_to_weekly_fills_the_rest_of_the_week(weekly):
+    # Saturday; the retention cutoff falls on Friday the 16th
+    now = datetime(2026, 10, 17, 6)
+    to_create, to_retire = plan_partitions(now, daily(16, 17))
+    
+    assert to_create == [
+        ("messages_p20261018", day(18), day(19)),
+        ("messages_p20261019", day(19), day(26)),
+    ]
+    assert to_retire == []
+
+
+def test_gaps_before_the_retention_cutoff_are_not_created(weekly):
+    now = datetime(2026, 10, 17, 6)
+    to_create, _ = plan_partitions(now, daily(16, 17))
+    
+    # [12th, 16th) ends before the cutoff and would be retired in the same run
+    assert all(upper > datetime(2026, 10, 16, 6) for _, _, upper in to_create)
+
+
+def test_planning_is_idempotent(weekly):
+    now = datetime(2026, 10, 17, 6)
+    to_create, _ = plan_partitions(now, daily(16, 17))
+    
+    assert plan_partitions(now, daily(16, 17) + to_create) == ([], [])
+
+
+def test_expired_partitions_are_retired(weekly):
+    now = datetime(2026, 10, 17, 6)
+    _, to_retire = plan_partitions(now, daily(14, 15, 16, 17))
+    
+    assert to_retire == ["messages_p20261014", "messages_p20261015"]